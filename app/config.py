@@ -10,6 +10,10 @@ DATA_DIR = Path(os.getenv('DATA_DIR'))
 
 # Geodata parameters
 CRS = os.getenv('CRS', 'EPSG:4326')
+# UTM Zone 16N (covers Illinois, Indiana, half of Wisconsin and Michigan)
+# This standard yields distances in meters to ensure consistency across lat and lon
+# For future reference: https://mangomap.com/robertyoung/maps/69585/what-utm-zone-am-i-in-#
+METRIC_CRS = os.getenv('METRIC_CRS', 'EPSG:32616')
 
 # Geodata paths
 CITY_FILE = Path(os.getenv('CITY_FILE'))
@@ -30,4 +34,37 @@ DESC_COL = os.getenv('DESC', 'business_activity')
 # Plot style
 DOT_COLOR=os.getenv('DOT_COLOR')
 EDGE_COLOR=os.getenv('EDGE_COLOR')
-BACKGROUND_COLOR=os.getenv('BACKGROUND_COLOR')
\ No newline at end of file
+BACKGROUND_COLOR=os.getenv('BACKGROUND_COLOR')
+
+# Response encoding
+PRECOMPRESS = os.getenv('PRECOMPRESS', 'true').lower() == 'true'
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 5))
+
+# Result cache
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', 256 * 1024**2))
+CACHE_TTL = float(os.getenv('CACHE_TTL', 0)) # Seconds, 0 = no expiry
+CACHE_DIR = Path(os.getenv('CACHE_DIR')) if os.getenv('CACHE_DIR') else None
+CACHE_DISK_MAX_BYTES = int(os.getenv('CACHE_DISK_MAX_BYTES', 1024**3))
+
+# Clustering jobs
+CLUSTER_WORKERS = int(os.getenv('CLUSTER_WORKERS', 2))
+CLUSTER_MAX_PENDING = int(os.getenv('CLUSTER_MAX_PENDING', 16))
+JOB_TTL = float(os.getenv('JOB_TTL', 600)) # Seconds a finished job is kept
+
+# Startup warm-up (defaults match the frontend's slider values)
+WARMUP = os.getenv('WARMUP', 'false').lower() == 'true'
+WARMUP_CLUSTERING = os.getenv('WARMUP_CLUSTERING', 'true').lower() == 'true'
+WARMUP_EPS = float(os.getenv('WARMUP_EPS', 0.0))
+WARMUP_MIN_SAMPLES = int(os.getenv('WARMUP_MIN_SAMPLES', 10))
+
+# Tiles
+TILE_EXTENT = int(os.getenv('TILE_EXTENT', 4096)) # Tile-local coordinate range
+TILE_AGGREGATE_ZOOM = int(os.getenv('TILE_AGGREGATE_ZOOM', 15)) # Raw points from this zoom on
+TILE_GRID = int(os.getenv('TILE_GRID', 128)) # Aggregation cells per tile side
+
+# Streaming exports
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 5000)) # Features per chunk
+
+# Static maps
+RASTER_THRESHOLD = int(os.getenv('RASTER_THRESHOLD', 5000)) # Points above which maps are rasterized with NumPy
@@ -1,18 +1,37 @@
 import pandas as pd
 import os
 
+from contextlib import asynccontextmanager
 from functools import lru_cache
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from app.routes.map import router as api_router
+from app.routes.cache import router as cache_router
+from app.warmup import WARMUP_STATE, start_warmup
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_warmup()
+    yield
 
 app = FastAPI(
     title='Chicago Geospatial Clustering',
     description='Application for the mapping and clustering of geospatial company data in Chicago',
-    version='1.0.0'
+    version='1.0.0',
+    lifespan=lifespan
 )
 
 app.include_router(api_router)
+app.include_router(cache_router)
 
 @app.get('/')
 def health_check():
+    if not WARMUP_STATE['ready']:
+        return JSONResponse(
+            status_code=503,
+            content={
+                'status': 'warming',
+                'message': f"Warm-up in progress ({WARMUP_STATE['done']}/{WARMUP_STATE['total']})"
+            }
+        )
     return {'status': 'ok', 'message': 'Engine Online'}
\ No newline at end of file
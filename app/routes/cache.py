@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+
+from app.utils.cache import cache_stats
+
+router = APIRouter()
+
+@router.get('/cache/stats')
+def get_cache_stats():
+    '''
+    Hit, miss and eviction counters of the result caches.
+    '''
+    return cache_stats()
@@ -1,18 +1,37 @@
 import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
 import io
 import logging
 import json
 
-from functools import lru_cache
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Query, Header, HTTPException
 from fastapi.responses import Response, StreamingResponse, JSONResponse, FileResponse
-from typing import Tuple, List
+from pydantic import BaseModel
+from typing import Tuple, List, Literal, Optional
 
 from app.config import *
-from app.utils.dataloader import load_data
-from app.utils.plotting import plot_geodata
-from app.utils.clustering import apply_clustering
+from app.utils.dataloader import (
+    load_data,
+    extract_coordinates,
+    project_coordinates,
+    materialize_geometry,
+    master_version
+)
+from app.utils.plotting import load_city, map_extent, plot_geodata, rasterize_points
+from app.utils.clustering import build_hierarchy, cluster_labels, cluster_summaries
 from app.utils.codes import list_codes
+from app.utils.encoding import EncodedPayload, encode_payload, payload_response
+from app.utils.binary import ARROW_MEDIA_TYPE, points_to_arrow
+from app.utils.cache import MISSING, ResultCache
+from app.utils.jobs import JobQueue, QueueFull
+from app.utils.indexing import build_activity_index, select_positions
+from app.utils.areas import AREA_COLUMNS, AREAS, area_names
+from app.utils.spatial import SpatialIndex
+from app.utils.density import density_geojson, density_json
+from app.utils.streaming import RECORD_SEPARATOR, STREAM_MEDIA_TYPES, iter_features
+from app.utils.tiles import MAX_ZOOM, build_tile, mercator_coordinates, tile_bounds
 
 router = APIRouter()
 logger = logging.getLogger('gunicorn.error')
@@ -22,48 +41,363 @@ logger = logging.getLogger('gunicorn.error')
 # ------------------------------
 try:
     logger.info('Loading Master Dataset into Memory...')
-    MASTER_GDF = load_data() 
-    logger.info(f'Data Loaded. Rows: {len(MASTER_GDF)}')
+    MASTER_DF = load_data() 
+    DATA_VERSION = master_version()
+    ACT_INDEX = build_activity_index(MASTER_DF, ACT_COL)
+    MASTER_LONLAT = extract_coordinates(MASTER_DF)
+    MASTER_METERS = project_coordinates(MASTER_LONLAT)
+    MASTER_NAMES = pa.array(MASTER_DF[NAME_COL], type=pa.string())
+    MASTER_MERCATOR = mercator_coordinates(MASTER_LONLAT)
+    SPATIAL_INDEX = SpatialIndex(MASTER_LONLAT, MASTER_METERS)
+    MASTER_AREAS = {kind: MASTER_DF[column].to_numpy(dtype=np.int32) for kind, column in AREA_COLUMNS.items()}
+    AREA_NAMES = {kind: area_names(kind) for kind in AREAS}
+    logger.info(f'Data Loaded. Rows: {len(MASTER_DF)}, activity codes: {len(ACT_INDEX)}')
 except Exception as e:
     logger.critical(f'CRITICAL: Failed to load data: {e}')
-    MASTER_GDF = gpd.GeoDataFrame()
+    MASTER_DF = pd.DataFrame()
+    DATA_VERSION = None
+    ACT_INDEX = {}
+    MASTER_LONLAT = np.empty((0, 2))
+    MASTER_METERS = np.empty((0, 2))
+    MASTER_NAMES = pa.array([], type=pa.string())
+    MASTER_MERCATOR = np.empty((0, 2))
+    SPATIAL_INDEX = SpatialIndex(MASTER_LONLAT, MASTER_METERS)
+    MASTER_AREAS = {kind: np.empty(0, dtype=np.int32) for kind in AREAS}
+    AREA_NAMES = {kind: {} for kind in AREAS}
+
+# ------------------------------
+# FILTERS
+# ------------------------------
+
+def parse_floats(
+    value: str,
+    count: int,
+    name: str
+) -> tuple[float, ...]:
+    '''
+    Parses a comma-separated query parameter such as bbox=-87.7,41.8,-87.6,41.9.
+    '''
+    try:
+        numbers = tuple(float(number) for number in value.split(','))
+    except ValueError:
+        numbers = ()
+    if len(numbers) != count:
+        raise HTTPException(status_code=400, detail=f'{name} expects {count} comma-separated numbers.')
+    return numbers
+
+def filter_key(
+    community_area: Optional[int]=None,
+    neighborhood: Optional[int]=None,
+    bbox: Optional[str]=None,
+    near: Optional[str]=None,
+    radius_m: Optional[float]=None
+) -> tuple:
+    '''
+    Hashable description of the optional row filters, part of the cache keys.
+    `bbox` is min_lon,min_lat,max_lon,max_lat; `near` is lat,lon (with radius_m).
+    '''
+    filters = [('community', community_area), ('neighborhood', neighborhood)]
+    
+    if bbox is not None:
+        filters.append(('bbox', parse_floats(bbox, 4, 'bbox')))
+    if near is not None:
+        if radius_m is None or radius_m <= 0:
+            raise HTTPException(status_code=400, detail='near requires a positive radius_m.')
+        lat, lon = parse_floats(near, 2, 'near')
+        filters.append(('near', (lon, lat, radius_m)))
+    
+    return tuple((name, value) for name, value in filters if value is not None)
+
+def apply_filters(
+    positions: np.ndarray,
+    filters: tuple
+) -> np.ndarray:
+    '''
+    Restricts sorted row positions to the rows matching every filter.
+    Area filters are a lookup in the precomputed area id columns,
+    bbox and radius filters are answered by the spatial index.
+    '''
+    for name, value in filters:
+        if name in MASTER_AREAS:
+            positions = positions[MASTER_AREAS[name][positions] == value]
+        elif name == 'bbox':
+            positions = np.intersect1d(positions, SPATIAL_INDEX.within_bbox(*value), assume_unique=True)
+        elif name == 'near':
+            positions = np.intersect1d(positions, SPATIAL_INDEX.within_radius(*value), assume_unique=True)
+    return positions
 
 # ------------------------------
 # CACHED FUNCTIONS
 # ------------------------------
 
-@lru_cache(maxsize=128)
+GEOJSON_CACHE = ResultCache('geojson', version=DATA_VERSION)
+POINTS_CACHE = ResultCache('points', version=DATA_VERSION)
+HIERARCHY_CACHE = ResultCache('hierarchy', version=DATA_VERSION)
+LABELS_CACHE = ResultCache('labels', version=DATA_VERSION)
+TILES_CACHE = ResultCache('tiles', version=DATA_VERSION, disk=False)
+DENSITY_CACHE = ResultCache('density', version=DATA_VERSION)
+RENDER_CACHE = ResultCache('renders', version=DATA_VERSION)
+
+@HIERARCHY_CACHE.memoize
+def get_hierarchy(
+    codes: tuple[str],
+    min_samples: int
+):
+    '''
+    Single-linkage tree of the selection, shared by every eps value
+    (the "Cluster Merging Distance" slider).
+    '''
+    positions = select_positions(ACT_INDEX, codes)
+    return build_hierarchy(MASTER_METERS[positions], min_samples=min_samples)
+
+@LABELS_CACHE.memoize
+def get_cluster_labels(
+    codes: tuple[str],
+    eps: float,
+    min_samples: int
+) -> np.ndarray:
+    '''
+    Cluster labels of the selection, aligned with select_positions(ACT_INDEX, codes).
+    '''
+    positions = select_positions(ACT_INDEX, codes)
+    return cluster_labels(
+        coords=MASTER_METERS[positions],
+        eps=eps, 
+        min_samples=min_samples,
+        hierarchy=get_hierarchy(codes, min_samples)
+    )
+
+def geojson_key(
+    act_codes,
+    clustering: bool,
+    eps: float,
+    min_samples: int,
+    filters: tuple=()
+) -> tuple:
+    '''
+    Normalized arguments of get_processed_clusters.
+    Clustering parameters are irrelevant (and zeroed) when clustering is off.
+    '''
+    codes = tuple(sorted(set(act_codes)))
+    if not clustering:
+        return codes, False, 0.0, 0, filters
+    return codes, True, float(eps), int(min_samples), filters
+
+def build_geojson(
+    positions: np.ndarray,
+    labels: Optional[np.ndarray]=None
+) -> Optional[EncodedPayload]:
+    '''
+    Serializes the selected rows, and their cluster labels if any, to GeoJSON.
+    The collection carries its bbox and, with clustering, a `clusters` foreign member
+    with the summary of each cluster (see cluster_summaries).
+    Returns None if the selection is empty.
+    '''
+    if len(positions) == 0:
+        return None
+    
+    filtered_gdf = materialize_geometry(MASTER_DF.iloc[positions])
+    members = {'bbox': filtered_gdf.total_bounds.tolist()}
+    if labels is not None:
+        filtered_gdf['cluster'] = labels
+        members['clusters'] = cluster_summaries(MASTER_LONLAT[positions], labels)
+    
+    # Extra top-level members are appended to the FeatureCollection object
+    collection = filtered_gdf.to_json()
+    return encode_payload(collection[:-1] + ', ' + json.dumps(members)[1:])
+
+def resolve_selection(
+    codes: tuple[str],
+    clustering: bool,
+    eps: float,
+    min_samples: int,
+    filters: tuple=()
+) -> tuple[np.ndarray, Optional[np.ndarray]]:
+    '''
+    Row positions of the filtered selection and, with clustering, their labels.
+    Clusters are computed on the whole activity selection, then filtered.
+    '''
+    selected = select_positions(ACT_INDEX, codes)
+    positions = apply_filters(selected, filters)
+    labels = None
+
+    if clustering and len(positions) > 0:
+        try:
+            labels = get_cluster_labels(codes, eps, min_samples)[np.searchsorted(selected, positions)]
+        except Exception as e:
+            logger.error(f'Clustering failed: {e}')
+            pass 
+
+    return positions, labels
+
+@GEOJSON_CACHE.memoize
 def get_processed_clusters(
     codes: list[str],
     clustering: bool,
     eps: float,
-    min_samples: int
-) -> str:
+    min_samples: int,
+    filters: tuple=()
+) -> Optional[EncodedPayload]:
     '''
     Perofrms filtering and clustering.
-    Returns a JSON string (cached).
+    Returns the encoded GeoJSON payload (cached), or None if nothing matches.
     '''
     
     if not codes:
-        return '{}'
+        return None
     
-    filtered_gdf = MASTER_GDF[MASTER_GDF[ACT_COL].isin(codes)].copy()
+    return build_geojson(*resolve_selection(codes, clustering, eps, min_samples, filters))
+
+@POINTS_CACHE.memoize
+def get_points_payload(
+    codes: tuple[str],
+    filters: tuple=(),
+    clustering: bool=False,
+    eps: float=0.0,
+    min_samples: int=0
+) -> Optional[EncodedPayload]:
+    '''
+    Builds the binary (Arrow IPC) points payload, with cluster labels if clustering.
+    Returns None if nothing matches.
+    '''
+    positions, labels = resolve_selection(codes, clustering, eps, min_samples, filters)
+    if len(positions) == 0:
+        return None
     
-    if filtered_gdf.empty:
-        return '{}'
+    return encode_payload(points_to_arrow(MASTER_LONLAT, MASTER_NAMES, positions, labels))
 
+@TILES_CACHE.memoize
+def get_tile(
+    codes: tuple[str],
+    z: int,
+    x: int,
+    y: int,
+    clustering: bool,
+    eps: float,
+    min_samples: int
+) -> Optional[EncodedPayload]:
+    '''
+    Builds a binary tile of the selection (see app/utils/tiles.py).
+    Returns None if the tile is empty.
+    '''
+    selected = select_positions(ACT_INDEX, codes)
+    positions = np.intersect1d(
+        selected,
+        SPATIAL_INDEX.within_bbox(*tile_bounds(z, x, y)),
+        assume_unique=True
+    )
+    if len(positions) == 0:
+        return None
+    
+    labels = None
     if clustering:
         try:
-            filtered_gdf = apply_clustering(
-                gdf=filtered_gdf, 
-                eps=eps, 
-                min_samples=min_samples
-            )
+            # Cluster labels of the whole selection, restricted to the tile
+            labels = get_cluster_labels(codes, eps, min_samples)[np.searchsorted(selected, positions)]
         except Exception as e:
             logger.error(f'Clustering failed: {e}')
-            pass 
+    
+    return encode_payload(
+        build_tile(MASTER_MERCATOR, positions, z, x, y, names=MASTER_NAMES, labels=labels)
+    )
 
-    return filtered_gdf.to_crs(CRS).to_json()
+@DENSITY_CACHE.memoize
+def get_density(
+    codes: tuple[str],
+    grid: str,
+    cell_size: float,
+    output: str
+) -> Optional[EncodedPayload]:
+    '''
+    Counts the selection per square or hex cell, in projected meters.
+    Returns None if nothing matches.
+    '''
+    positions = select_positions(ACT_INDEX, codes)
+    if len(positions) == 0:
+        return None
+    
+    encode = density_geojson if output == 'geojson' else density_json
+    return encode_payload(encode(MASTER_METERS[positions], cell_size, grid))
+
+@RENDER_CACHE.memoize
+def get_render(
+    codes: tuple[str],
+    clustering: bool,
+    eps: float,
+    min_samples: int,
+    filters: tuple,
+    width: int,
+    height: int,
+    marker_size: float,
+    fmt: str
+) -> Optional[bytes]:
+    '''
+    Static map image of the selection over the city outline.
+    Selections above RASTER_THRESHOLD are rasterized with NumPy instead of matplotlib.
+    '''
+    positions, labels = resolve_selection(codes, clustering, eps, min_samples, filters)
+    if len(positions) == 0:
+        return None
+    
+    meters = MASTER_METERS[positions]
+    if len(positions) > RASTER_THRESHOLD:
+        return rasterize_points(meters, labels, width, height, marker_size, fmt)
+    
+    gdf = gpd.GeoDataFrame(geometry=gpd.points_from_xy(meters[:, 0], meters[:, 1]), crs=METRIC_CRS)
+    if labels is not None:
+        gdf['cluster'] = labels
+    
+    return plot_geodata(
+        gdf, {'city': load_city()}, marker_size,
+        width, height, fmt=fmt, extent=map_extent(width, height)
+    )
+
+# ------------------------------
+# CLUSTERING JOBS
+# ------------------------------
+
+CLUSTER_JOBS = JobQueue()
+
+class ClusterJobRequest(BaseModel):
+    act_codes: list[str]
+    eps: float = 0.02
+    min_samples: int = 5
+
+def submit_cluster_job(
+    codes: tuple[str],
+    eps: float,
+    min_samples: int
+):
+    '''
+    Schedules the clustering of a selection in the job pool.
+    The result is stored under the same key as /geojson, so both share it.
+    '''
+    key = geojson_key(codes, True, eps, min_samples)
+    
+    cached = GEOJSON_CACHE.get(key)
+    if cached is not MISSING:
+        return CLUSTER_JOBS.add_result(key, cached)
+    
+    positions = select_positions(ACT_INDEX, codes)
+    if len(positions) == 0:
+        return CLUSTER_JOBS.add_result(key, None)
+    
+    def finalize(labels):
+        # Same key as get_cluster_labels: /geojson, /map and /points/arrow reuse the labels
+        label_codes, _, label_eps, label_min_samples, _ = key
+        LABELS_CACHE.put((label_codes, label_eps, label_min_samples), labels)
+        payload = build_geojson(positions, labels)
+        GEOJSON_CACHE.put(key, payload)
+        return payload
+    
+    return CLUSTER_JOBS.submit(
+        key,
+        cluster_labels,
+        MASTER_METERS[positions],
+        eps,
+        min_samples,
+        finalize=finalize
+    )
 
 # ------------------------------
 # API ROUTES
@@ -71,51 +405,258 @@ def get_processed_clusters(
 
 @router.get('/codes')
 def get_codes():
-    return list_codes(MASTER_GDF)
+    return list_codes(MASTER_DF)
 
 @router.get('/geojson')
 def get_geojson(
     act_codes: list[str]=Query(...), 
     clustering: bool=False, 
     eps: float=0.02,
-    min_samples: int=5
+    min_samples: int=5,
+    community_area: Optional[int]=None,
+    neighborhood: Optional[int]=None,
+    bbox: Optional[str]=None,
+    near: Optional[str]=None,
+    radius_m: Optional[float]=None,
+    format: Literal['geojson', 'geojsonseq', 'ndjson']='geojson',
+    accept_encoding: str=Header('')
 ):
     '''
     Endpoint that acts as a wrapper around the cached function.
+    With format=geojsonseq (RFC 8142) or ndjson, features are streamed
+    in chunks instead of being serialized as one FeatureCollection.
     '''
     # 1. Validate Input
     if not act_codes:
         return JSONResponse(status_code=400, content={'message': 'No codes provided'})
 
-    # 2. Convert List to Tuple (necessary for caching)
-    codes = tuple(sorted(act_codes))
+    # 2. Normalize arguments into a hashable key (necessary for caching)
+    filters = filter_key(community_area, neighborhood, bbox, near, radius_m)
+    key = geojson_key(act_codes, clustering, eps, min_samples, filters)
+    
+    # 2b. Streaming exports bypass the payload cache (labels stay cached)
+    if format in STREAM_MEDIA_TYPES:
+        positions, labels = resolve_selection(*key)
+        if len(positions) == 0:
+            return Response(status_code=204)
+        return StreamingResponse(
+            iter_features(
+                MASTER_DF,
+                MASTER_LONLAT,
+                positions,
+                labels,
+                record_separator=RECORD_SEPARATOR if format == 'geojsonseq' else ''
+            ),
+            media_type=STREAM_MEDIA_TYPES[format]
+        )
 
     # 3. Call Cached Function
-    geojson_str = get_processed_clusters(codes, clustering, eps, min_samples)
+    payload = get_processed_clusters(*key)
     
     # 4. Handle Empty Results
-    if geojson_str == '{}':
+    if payload is None:
         return Response(status_code=204)
 
-    # 5. Return Pre-calculated JSON
-    return JSONResponse(content=json.loads(geojson_str))
+    # 5. Return Pre-encoded GeoJSON (no re-parsing)
+    return payload_response(payload, accept_encoding)
 
 @router.get('/points')
 def get_lean_points(
-    act_codes: List[str] = Query(...)
+    act_codes: List[str] = Query(...),
+    community_area: Optional[int]=None,
+    neighborhood: Optional[int]=None,
+    bbox: Optional[str]=None,
+    near: Optional[str]=None,
+    radius_m: Optional[float]=None
 ):
     '''
     Fast path for simple coordinate lists.
     '''
     # Direct memory filter (No I/O)
-    filtered_gdf = MASTER_GDF[MASTER_GDF[ACT_COL].isin(act_codes)]
+    positions = apply_filters(
+        select_positions(ACT_INDEX, act_codes),
+        filter_key(community_area, neighborhood, bbox, near, radius_m)
+    )
     
-    if filtered_gdf.empty:
+    if len(positions) == 0:
         return []
 
-    # Fast formatting
-    data = filtered_gdf[[NAME_COL, 'geometry']].copy()
-    data['lat'] = data.geometry.y # GeoPandas uses x=lon, y=lat
-    data['lon'] = data.geometry.x
+    # Fast formatting from the precomputed coordinates (x=lon, y=lat)
+    data = pd.DataFrame({
+        'lat': MASTER_LONLAT[positions, 1],
+        'lon': MASTER_LONLAT[positions, 0],
+        NAME_COL: MASTER_DF[NAME_COL].iloc[positions].to_numpy(dtype=object)
+    })
+    
+    return data.values.tolist()
+
+@router.get('/points/arrow')
+def get_binary_points(
+    act_codes: List[str] = Query(...),
+    clustering: bool=False,
+    eps: float=0.02,
+    min_samples: int=5,
+    community_area: Optional[int]=None,
+    neighborhood: Optional[int]=None,
+    bbox: Optional[str]=None,
+    near: Optional[str]=None,
+    radius_m: Optional[float]=None,
+    accept_encoding: str=Header('')
+):
+    '''
+    Columnar variant of /points for WebGL clients.
+    Streams float32 lon/lat and dictionary-encoded names as Arrow IPC,
+    and int32 cluster labels with clustering.
+    '''
+    codes, clustering, eps, min_samples, filters = geojson_key(
+        act_codes, clustering, eps, min_samples,
+        filter_key(community_area, neighborhood, bbox, near, radius_m)
+    )
+    payload = get_points_payload(codes, filters, clustering, eps, min_samples)
+    
+    if payload is None:
+        return Response(status_code=204)
+    
+    return payload_response(payload, accept_encoding, media_type=ARROW_MEDIA_TYPE)
+
+@router.post('/cluster-jobs', status_code=202)
+def create_cluster_job(request: ClusterJobRequest):
+    '''
+    Starts a background clustering job and returns its id.
+    Poll GET /cluster-jobs/{job_id} for the result.
+    '''
+    if not request.act_codes:
+        return JSONResponse(status_code=400, content={'message': 'No codes provided'})
+    
+    try:
+        job = submit_cluster_job(
+            tuple(sorted(request.act_codes)),
+            request.eps,
+            request.min_samples
+        )
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    
+    return {'job_id': job.id, 'status': job.status}
+
+@router.get('/cluster-jobs/{job_id}')
+def get_cluster_job(
+    job_id: str,
+    accept_encoding: str=Header('')
+):
+    '''
+    Returns the job status (202 while pending), then the clustered GeoJSON.
+    '''
+    job = CLUSTER_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f'Unknown job: {job_id}')
+    
+    status = job.status
+    if status == 'failed':
+        return JSONResponse(status_code=500, content={'job_id': job.id, 'status': status, 'error': job.error})
+    if status != 'done':
+        return JSONResponse(status_code=202, content={'job_id': job.id, 'status': status})
+    
+    if job.result is None:
+        return Response(status_code=204)
+    
+    return payload_response(job.result, accept_encoding)
+
+@router.get('/tiles/{z}/{x}/{y}')
+def get_tiles(
+    z: int,
+    x: int,
+    y: int,
+    act_codes: List[str] = Query(...),
+    clustering: bool=False,
+    eps: float=0.02,
+    min_samples: int=5,
+    accept_encoding: str=Header('')
+):
+    '''
+    Binary (Arrow IPC) tile of the selected businesses, aggregated at low zoom.
+    With clustering, tiles carry the cluster label of each point or aggregate.
+    '''
+    if not 0 <= z <= MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail=f'Invalid tile: {z}/{x}/{y}')
+    
+    codes, clustering, eps, min_samples, _ = geojson_key(act_codes, clustering, eps, min_samples)
+    payload = get_tile(codes, z, x, y, clustering, eps, min_samples)
+    
+    if payload is None:
+        return Response(status_code=204)
+    
+    return payload_response(payload, accept_encoding, media_type=ARROW_MEDIA_TYPE)
+
+@router.get('/density')
+def get_density_grid(
+    act_codes: List[str] = Query(...),
+    grid: Literal['square', 'hex']='square',
+    cell_size: float=Query(250.0, gt=10.0, le=10000.0),
+    format: Literal['json', 'geojson']='json',
+    accept_encoding: str=Header('')
+):
+    '''
+    Business density of the selection on a grid of `cell_size` meters.
+    'json' returns parallel arrays of cell indices and counts,
+    'geojson' returns one polygon per non-empty cell.
+    '''
+    payload = get_density(tuple(sorted(set(act_codes))), grid, cell_size, format)
+    
+    if payload is None:
+        return Response(status_code=204)
+    
+    media_type = 'application/geo+json' if format == 'geojson' else 'application/json'
+    return payload_response(payload, accept_encoding, media_type=media_type)
+
+@router.get('/map')
+def get_static_map(
+    act_codes: list[str]=Query(...),
+    clustering: bool=False,
+    eps: float=0.02,
+    min_samples: int=5,
+    community_area: Optional[int]=None,
+    neighborhood: Optional[int]=None,
+    bbox: Optional[str]=None,
+    near: Optional[str]=None,
+    radius_m: Optional[float]=None,
+    width: int=Query(1200, ge=100, le=4096),
+    height: int=Query(1200, ge=100, le=4096),
+    marker_size: float=Query(2.0, gt=0.0, le=20.0),
+    format: Literal['png', 'webp']='png'
+):
+    '''
+    Static map image of the selection, at the requested resolution in pixels.
+    `marker_size` is the dot diameter in pixels, capped to bound the rendering time.
+    '''
+    filters = filter_key(community_area, neighborhood, bbox, near, radius_m)
+    image = get_render(
+        *geojson_key(act_codes, clustering, eps, min_samples, filters),
+        width, height, marker_size, format
+    )
+    
+    if image is None:
+        return Response(status_code=204)
+    
+    return Response(content=image, media_type=f'image/{format}')
+
+@router.get('/areas/{kind}')
+def get_area_counts(
+    kind: Literal['community', 'neighborhood'],
+    act_codes: Optional[List[str]] = Query(None)
+):
+    '''
+    Number of businesses per community area or neighborhood, largest first.
+    Counts every business if no activity code is given.
+    '''
+    area_ids = MASTER_AREAS[kind]
+    if act_codes:
+        area_ids = area_ids[select_positions(ACT_INDEX, act_codes)]
+    
+    names = AREA_NAMES[kind]
+    counts = np.bincount(area_ids[area_ids >= 0], minlength=max(names, default=-1) + 1)
     
-    return data[['lat', 'lon', NAME_COL]].values.tolist()
\ No newline at end of file
+    return sorted(
+        [{'id': area_id, 'name': name, 'count': int(counts[area_id])} for area_id, name in names.items()],
+        key=lambda area: -area['count']
+    )
\ No newline at end of file
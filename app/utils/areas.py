@@ -0,0 +1,55 @@
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from app.config import *
+
+# Area kind: (boundary file, id column in the master data, id field, name field)
+# Neighborhoods have no numeric id in the source file: their row order is used.
+AREAS = {
+    'community': (COM_AREAS_FILE, 'community_area_id', 'area_numbe', 'community'),
+    'neighborhood': (NEIGH_FILE, 'neighborhood_id', None, 'pri_neigh')
+}
+AREA_COLUMNS = {kind: spec[1] for kind, spec in AREAS.items()}
+
+def load_areas(kind: str) -> gpd.GeoDataFrame:
+    '''
+    Loads the boundaries of an area kind with integer `area_id` and `name` columns.
+    '''
+    path, _, id_field, name_field = AREAS[kind]
+    areas = gpd.read_file(path).to_crs(CRS)
+    
+    area_ids = areas[id_field].astype(int) if id_field else np.arange(len(areas))
+    return gpd.GeoDataFrame(
+        {'area_id': np.asarray(area_ids, dtype=np.int32), 'name': areas[name_field].astype(str).str.title()},
+        geometry=areas.geometry.values,
+        crs=CRS
+    )
+
+def area_names(kind: str) -> dict[int, str]:
+    areas = load_areas(kind)
+    return dict(zip(areas['area_id'].tolist(), areas['name'].tolist()))
+
+def join_areas(
+    points: np.ndarray,
+    areas: gpd.GeoDataFrame
+) -> np.ndarray:
+    '''
+    Vectorized point-in-polygon join through an STRtree over the area polygons.
+    Returns the int32 area id of each point, -1 outside every area.
+    '''
+    tree = shapely.STRtree(areas.geometry.values)
+    point_idx, area_idx = tree.query(points, predicate='within')
+    
+    area_ids = np.full(len(points), -1, dtype=np.int32)
+    area_ids[point_idx] = areas['area_id'].to_numpy()[area_idx]
+    return area_ids
+
+def assign_areas(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    '''
+    Adds the community area and neighborhood id columns to a point GeoDataFrame.
+    '''
+    points = gdf.geometry.to_crs(CRS).values
+    for kind, column in AREA_COLUMNS.items():
+        gdf[column] = join_areas(points, load_areas(kind))
+    return gdf
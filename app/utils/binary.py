@@ -0,0 +1,39 @@
+import numpy as np
+import pyarrow as pa
+
+from app.config import *
+
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+def points_to_arrow(
+    lonlat: np.ndarray,
+    names: pa.Array,
+    positions: np.ndarray,
+    labels: np.ndarray=None
+) -> bytes:
+    '''
+    Serializes the selected rows as an Arrow IPC stream:
+    little-endian float32 `lon`/`lat` columns and a dictionary-encoded name column,
+    plus an int32 `cluster` column if labels are given.
+    '''
+    coords = lonlat[positions].astype('<f4')
+    columns = {
+        'lon': pa.array(coords[:, 0]),
+        'lat': pa.array(coords[:, 1]),
+        NAME_COL: names.take(pa.array(positions)).dictionary_encode()
+    }
+    if labels is not None:
+        columns['cluster'] = pa.array(labels.astype(np.int32))
+    table = pa.table(columns)
+    
+    return table_to_ipc(table)
+
+def table_to_ipc(table: pa.Table) -> bytes:
+    '''
+    Serializes a table as an Arrow IPC stream.
+    '''
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,251 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Hashable
+
+from app.config import *
+from app.utils.singleflight import SingleFlight
+
+logger = logging.getLogger('gunicorn.error')
+
+MISSING = object()
+
+# All result caches share one byte budget, evicted in LRU order.
+# Entries are keyed by (cache name, key): (value, size in bytes, creation time)
+_ENTRIES: OrderedDict = OrderedDict()
+_LOCK = threading.Lock()
+_STATE = {'bytes': 0}
+
+CACHES: dict[str, 'ResultCache'] = {}
+
+def sizeof(value: Any) -> int:
+    '''
+    Approximate memory footprint of a cached value, in bytes.
+    '''
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+class ResultCache:
+    '''
+    Named view over the shared, byte-bounded in-memory cache.
+    
+    Entries expire after CACHE_TTL seconds (if set) and are namespaced by the
+    data version (master file mtime), so results computed against an older
+    master file are never served. If CACHE_DIR is set, entries are also
+    written to disk so that other workers can reuse them instead of recomputing.
+    Concurrent misses on the same key are computed once (see SingleFlight).
+    '''
+    def __init__(
+        self,
+        name: str,
+        version: Hashable=None,
+        disk: bool=True
+    ):
+        self.name = name
+        self.version = version
+        self.disk_dir = CACHE_DIR / name if (disk and CACHE_DIR) else None
+        
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+        self.entries = 0
+        self.bytes = 0
+        
+        self._flights = SingleFlight()
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+        CACHES[name] = self
+    
+    # ------------------------------
+    # Memory tier
+    # ------------------------------
+    
+    def get(self, key: Hashable, count: bool=True) -> Any:
+        '''
+        Returns the cached value, or MISSING.
+        With `count=False` the lookup is left out of the hit/miss statistics.
+        '''
+        now = time.time()
+        with _LOCK:
+            entry = _ENTRIES.get((self.name, key))
+            if entry is not None:
+                value, nbytes, created = entry
+                if CACHE_TTL and now - created > CACHE_TTL:
+                    self._drop((self.name, key))
+                    self.expirations += 1
+                else:
+                    _ENTRIES.move_to_end((self.name, key))
+                    self.hits += count
+                    return value
+        
+        value = self._read_disk(key, now)
+        with _LOCK:
+            if value is MISSING:
+                self.misses += count
+                return MISSING
+            self.disk_hits += count
+        self._store(key, value, now)
+        return value
+    
+    def put(self, key: Hashable, value: Any):
+        now = time.time()
+        self._store(key, value, now)
+        self._write_disk(key, value)
+    
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+        
+        def compute_and_put():
+            # A flight for this key may have finished between the lookup above
+            # and this one starting: its result is already cached
+            value = self.get(key, count=False)
+            if value is not MISSING:
+                return value
+            value = compute()
+            self.put(key, value)
+            return value
+        
+        value, shared = self._flights.do(key, compute_and_put)
+        if shared:
+            with _LOCK:
+                self.coalesced += 1
+        return value
+    
+    def memoize(self, func: Callable) -> Callable:
+        '''
+        Decorator replacing lru_cache: positional arguments form the key.
+        '''
+        @wraps(func)
+        def wrapper(*args):
+            return self.get_or_compute(args, lambda: func(*args))
+        wrapper.cache = self
+        return wrapper
+    
+    def clear(self):
+        with _LOCK:
+            for full_key in [k for k in _ENTRIES if k[0] == self.name]:
+                self._drop(full_key)
+    
+    def stats(self) -> dict:
+        with _LOCK:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'coalesced': self.coalesced,
+                'entries': self.entries,
+                'bytes': self.bytes
+            }
+    
+    def _store(self, key: Hashable, value: Any, created: float):
+        nbytes = sizeof(value)
+        if nbytes > CACHE_MAX_BYTES:
+            return
+        
+        with _LOCK:
+            full_key = (self.name, key)
+            if full_key in _ENTRIES:
+                self._drop(full_key)
+            _ENTRIES[full_key] = (value, nbytes, created)
+            self.entries += 1
+            self.bytes += nbytes
+            _STATE['bytes'] += nbytes
+            
+            while _STATE['bytes'] > CACHE_MAX_BYTES:
+                oldest = next(iter(_ENTRIES))
+                CACHES[oldest[0]]._drop(oldest)
+                CACHES[oldest[0]].evictions += 1
+    
+    def _drop(self, full_key: tuple):
+        # Caller holds _LOCK
+        _, nbytes, _ = _ENTRIES.pop(full_key)
+        self.entries -= 1
+        self.bytes -= nbytes
+        _STATE['bytes'] -= nbytes
+    
+    # ------------------------------
+    # Disk tier (shared between workers)
+    # ------------------------------
+    
+    def _disk_path(self, key: Hashable) -> Path:
+        digest = hashlib.sha256(repr((self.version, key)).encode('utf-8')).hexdigest()
+        return self.disk_dir / f'{digest}.pkl'
+    
+    def _read_disk(self, key: Hashable, now: float) -> Any:
+        if self.disk_dir is None:
+            return MISSING
+        
+        path = self._disk_path(key)
+        try:
+            if CACHE_TTL and now - path.stat().st_mtime > CACHE_TTL:
+                return MISSING
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return MISSING
+        except Exception as e:
+            logger.warning(f'Could not read cache entry {path}: {e}')
+            return MISSING
+    
+    def _write_disk(self, key: Hashable, value: Any):
+        if self.disk_dir is None:
+            return
+        
+        try:
+            # Atomic write: readers in other workers never see partial files
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._disk_path(key))
+        except Exception as e:
+            logger.warning(f'Could not write cache entry for {self.name}: {e}')
+            return
+        
+        self._prune_disk()
+    
+    def _prune_disk(self):
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith('.pkl'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= CACHE_DISK_MAX_BYTES:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+def cache_stats() -> dict:
+    '''
+    Counters for every registered cache, plus the shared memory budget.
+    '''
+    return {
+        'max_bytes': CACHE_MAX_BYTES,
+        'bytes': _STATE['bytes'],
+        'caches': {name: cache.stats() for name, cache in CACHES.items()}
+    }
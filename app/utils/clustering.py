@@ -1,31 +1,118 @@
-import geopandas as gpd
+import numpy as np
+import shapely
+
+import json
+from typing import Optional
 from sklearn.cluster import HDBSCAN
 
-def apply_clustering(
-    gdf: gpd.GeoDataFrame,
-    eps: float=0.02, 
-    min_samples: int=5, 
+try:
+    # Flat cluster extraction from a fitted single-linkage tree.
+    # Private scikit-learn API: if it moves, we fall back to a full refit.
+    from sklearn.cluster._hdbscan._tree import tree_to_labels
+except ImportError:
+    tree_to_labels = None
+
+CLUSTER_SELECTION_METHOD = 'leaf'
+
+def build_hierarchy(
+    coords: np.ndarray,
+    min_samples: int=5,
     n_jobs: int=4
-):
-    if len(gdf) < min_samples:
-        gdf['cluster'] = -1
-        return gdf
+) -> Optional[np.ndarray]:
+    '''
+    Fits HDBSCAN once and returns its single-linkage tree.
+    The tree only depends on the points and `min_samples`, not on the
+    cluster_selection_epsilon: it can be reused for any eps (see extract_labels).
+    Returns None if the tree cannot be reused or there are too few points.
+    '''
+    if tree_to_labels is None or len(coords) < min_samples:
+        return None
     
-    # Conversion to UTM Zone 16N (covers Illinois, Indiana, half of Wisconsin and Michigan)
-    # This standard yields distances in meters to ensure consistency across lat and lon
-    # For future reference: https://mangomap.com/robertyoung/maps/69585/what-utm-zone-am-i-in-#
-    gdf_meters = gdf.to_crs(epsg=32616)
+    clusterer=HDBSCAN(
+        cluster_selection_method=CLUSTER_SELECTION_METHOD,
+        min_cluster_size=min_samples, 
+        n_jobs=n_jobs
+    )
+    clusterer.fit(coords)
+    return clusterer._single_linkage_tree_
+
+def extract_labels(
+    hierarchy: np.ndarray,
+    eps: float=0.02,
+    min_samples: int=5
+) -> np.ndarray:
+    '''
+    Condenses the single-linkage tree and cuts flat clusters for a given eps.
+    Linear in the number of points: no distance computations.
+    '''
+    labels, _ = tree_to_labels(
+        hierarchy,
+        min_samples,
+        CLUSTER_SELECTION_METHOD,
+        False,
+        eps,
+        None
+    )
+    return labels
+
+def cluster_labels(
+    coords: np.ndarray,
+    eps: float=0.02, 
+    min_samples: int=5, 
+    n_jobs: int=4,
+    hierarchy: Optional[np.ndarray]=None
+) -> np.ndarray:
+    '''
+    HDBSCAN labels of (N, 2) projected coordinates, in meters
+    (see project_coordinates in app/utils/dataloader.py).
+    If a `hierarchy` from build_hierarchy is given, labels are re-extracted
+    from it instead of refitting.
+    '''
+    if len(coords) < min_samples:
+        return np.full(len(coords), -1)
     
-    coords = gdf_meters.geometry.apply(
-        lambda geom: (geom.x, geom.y)
-    ).tolist()
+    if hierarchy is not None:
+        return extract_labels(hierarchy, eps=eps, min_samples=min_samples)
     
     clusterer=HDBSCAN(
-        cluster_selection_method='leaf',
+        cluster_selection_method=CLUSTER_SELECTION_METHOD,
         cluster_selection_epsilon=eps,
         min_cluster_size=min_samples, 
         n_jobs=n_jobs
     )
     
-    gdf['cluster']=clusterer.fit_predict(coords)
-    return gdf
\ No newline at end of file
+    return clusterer.fit_predict(coords)
+
+def cluster_summaries(
+    lonlat: np.ndarray,
+    labels: np.ndarray
+) -> list[dict]:
+    '''
+    Per-cluster summaries of a labelled selection (noise excluded): member count,
+    centroid, bbox and convex hull as a GeoJSON geometry (a Point or LineString for degenerate clusters).
+    All clusters are reduced at once, on the points sorted by label.
+    '''
+    clustered = np.flatnonzero(labels >= 0)
+    if len(clustered) == 0:
+        return []
+    
+    order = clustered[np.argsort(labels[clustered], kind='stable')]
+    ids, starts, counts = np.unique(labels[order], return_index=True, return_counts=True)
+    coords = lonlat[order]
+    
+    centroids = np.add.reduceat(coords, starts) / counts[:, None]
+    mins = np.minimum.reduceat(coords, starts)
+    maxs = np.maximum.reduceat(coords, starts)
+    hulls = shapely.convex_hull(shapely.multipoints(coords, indices=np.repeat(np.arange(len(ids)), counts)))
+    
+    return [
+        {
+            'cluster': int(cluster_id),
+            'count': int(count),
+            'centroid': centroid.tolist(),
+            'bbox': [*low.tolist(), *high.tolist()],
+            'hull': json.loads(hull)
+        }
+        for cluster_id, count, centroid, low, high, hull
+        in zip(ids, counts, centroids, mins, maxs, shapely.to_geojson(hulls))
+    ]
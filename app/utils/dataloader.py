@@ -1,30 +1,170 @@
+import numpy as np
 import pandas as pd
 import geopandas as gpd
+import pyarrow as pa
+import shapely
 
+import hashlib
+
+from pyarrow import feather
+from pyproj import Transformer
 from shapely import wkb
 from logging import Logger
-from typing import Optional, List
+from typing import Optional
+from urllib.parse import quote
 
 from app.config import *
+from app.utils.areas import AREA_COLUMNS, join_areas, load_areas
 
 logger = Logger(__file__)
 
-def load_data() -> gpd.GeoDataFrame:
+COORD_COLS = ['lon', 'lat']
+DATASET_NAME = 'by_activity'
+# Partition key of the dataset (the condensed label, see data/extraction_v2.py)
+PARTITION_COL = 'clean_activity'
+# Leading underscore: ignored by pyarrow when reading a partitioned dataset
+MANIFEST_FILE = '_manifest.json'
+
+def find_master_file() -> Path:
     '''
-    Loads data from the master Parquet file.
+    Locates the master file in DATA_DIR.
+    The memory-mappable Arrow file (see write_master_arrow) is preferred over Parquet,
+    then over the partitioned dataset written by data/extraction_v2.py.
     '''
     data_path = Path(DATA_DIR)
     
-    file_to_load = list(data_path.glob('*.parquet'))
-    if len(file_to_load) > 1:
-        logger.critical(f'More than one master file found in {DATA_DIR}.')
-    else:
-        master_path = Path(file_to_load[0])
+    for pattern in ('*.arrow', '*.parquet'):
+        file_to_load = list(data_path.glob(pattern))
+        if len(file_to_load) > 1:
+            logger.critical(f'More than one master file found in {DATA_DIR}.')
+        elif file_to_load:
+            return Path(file_to_load[0])
+    
+    return find_dataset()
+
+def find_dataset() -> Optional[Path]:
+    '''
+    Locates the Hive-partitioned dataset (one `<PARTITION_COL>=<label>` directory per activity) in DATA_DIR.
+    '''
+    dataset_path = Path(DATA_DIR) / DATASET_NAME
+    return dataset_path if dataset_path.is_dir() else None
+
+def partition_name(column: str, value: str) -> str:
+    '''
+    Hive partition directory of a value, percent-encoded as pyarrow expects
+    (spaces and common punctuation are kept, to stay well under filename limits).
+    '''
+    return f'{column}={quote(str(value), safe=" ,()-")}'
+
+def master_version() -> str:
+    '''
+    Identifies the current master file by its modification time, or a partitioned
+    dataset by the content digests of its manifest (see data/manifest.py).
+    Used to namespace cached results (see app/utils/cache.py).
+    '''
+    master_path = find_master_file()
+    if master_path.is_dir():
+        manifest_path = master_path / MANIFEST_FILE
+        if manifest_path.exists():
+            return f'{master_path.name}@{hashlib.sha1(manifest_path.read_bytes()).hexdigest()}'
+        # Partitions are replaced (not modified in place) by the extraction
+        mtime = max(path.stat().st_mtime_ns for path in [master_path, *master_path.rglob('*')])
+        return f'{master_path.name}@{mtime}'
+    return f'{master_path.name}@{master_path.stat().st_mtime_ns}'
+
+def to_master_frame(gdf: gpd.GeoDataFrame) -> pd.DataFrame:
+    '''
+    Flattens point geometries into plain `lon`/`lat` float columns.
+    Rows are sorted once by activity, so that each code maps to a contiguous
+    row range (see app/utils/indexing.py).
+    '''
+    gdf = gdf.dropna(subset='geometry')
+    
+    df = pd.DataFrame(gdf.drop(columns='geometry'))
+    df['lon'] = gdf.geometry.x.to_numpy()
+    df['lat'] = gdf.geometry.y.to_numpy()
+    df = ensure_areas(df)
+    
+    if ACT_COL in df.columns:
+        df = df.sort_values(ACT_COL, kind='stable', na_position='last')
+    return df
+
+def ensure_areas(df: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Adds the community area and neighborhood ids if the master file predates them
+    (see assign_areas in app/utils/areas.py, run by the extraction pipeline).
+    '''
+    missing = [kind for kind, column in AREA_COLUMNS.items() if column not in df.columns]
+    if missing:
+        points = shapely.points(extract_coordinates(df))
+        for kind in missing:
+            df[AREA_COLUMNS[kind]] = join_areas(points, load_areas(kind))
+    return df
+
+def write_master_arrow(
+    gdf: gpd.GeoDataFrame,
+    output_path: Path
+):
+    '''
+    Writes the master dataset as an uncompressed Arrow IPC (Feather v2) file,
+    which the backend memory-maps (see load_data).
+    '''
+    table = pa.Table.from_pandas(to_master_frame(gdf), preserve_index=True)
+    feather.write_feather(table, str(output_path), compression='uncompressed')
+
+def read_partitioned(dataset_path: Path) -> gpd.GeoDataFrame:
+    '''
+    Reads a whole partitioned dataset. The partition key comes back as a column.
+    '''
+    gdf = gpd.read_parquet(dataset_path)
+    # Partition keys come back as categoricals
+    gdf[PARTITION_COL] = gdf[PARTITION_COL].astype(str)
+    return gdf
+
+def load_data() -> pd.DataFrame:
+    '''
+    Loads the master dataset as a flat frame with `lon`/`lat` columns.
+    Arrow files are memory-mapped without copies: all worker processes share
+    the same page cache. Geometries are only built on demand (see materialize_geometry).
+    '''
+    master_path = find_master_file()
     
     try:
-        gdf = gpd.read_parquet(master_path)
-        if 'geometry' in gdf.columns:
-            gdf = gdf.dropna(subset='geometry')
-        return gpd.GeoDataFrame(gdf, geometry='geometry', crs=CRS)
+        if master_path.suffix == '.arrow':
+            source = pa.memory_map(str(master_path), 'r')
+            table = pa.ipc.open_file(source).read_all()
+            return ensure_areas(table.to_pandas(types_mapper=pd.ArrowDtype))
+        if master_path.is_dir():
+            return to_master_frame(read_partitioned(master_path))
+        return to_master_frame(gpd.read_parquet(master_path))
     except Exception as e:
-        logger.error(f'Error reading {master_path}: {e}')
\ No newline at end of file
+        logger.error(f'Error reading {master_path}: {e}')
+
+def materialize_geometry(df: pd.DataFrame) -> gpd.GeoDataFrame:
+    '''
+    Builds the point geometries of a selection of the master frame.
+    '''
+    geometry = gpd.points_from_xy(
+        df['lon'].to_numpy(dtype=np.float64),
+        df['lat'].to_numpy(dtype=np.float64)
+    )
+    return gpd.GeoDataFrame(df.drop(columns=COORD_COLS), geometry=geometry, crs=CRS)
+
+def extract_coordinates(df: pd.DataFrame) -> np.ndarray:
+    '''
+    Returns a contiguous (N, 2) float64 array of point coordinates (x=lon, y=lat),
+    aligned with the row positions of the frame.
+    '''
+    return np.ascontiguousarray(df[COORD_COLS].to_numpy(dtype=np.float64))
+
+def project_coordinates(
+    lonlat: np.ndarray,
+    crs: str=METRIC_CRS
+) -> np.ndarray:
+    '''
+    Projects (N, 2) lon/lat coordinates to a metric CRS (UTM 16N by default).
+    Returns a contiguous float64 (N, 2) array with the same row order.
+    '''
+    transformer = Transformer.from_crs(CRS, crs, always_xy=True)
+    x, y = transformer.transform(lonlat[:, 0], lonlat[:, 1])
+    return np.ascontiguousarray(np.column_stack([x, y]), dtype=np.float64)
\ No newline at end of file
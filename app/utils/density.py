@@ -0,0 +1,118 @@
+import json
+import numpy as np
+
+from pyproj import Transformer
+
+from app.config import *
+
+SQRT3 = np.sqrt(3.0)
+
+def square_cells(meters: np.ndarray, cell_size: float) -> np.ndarray:
+    '''
+    (N, 2) integer (column, row) indices of square cells anchored at the CRS origin:
+    cell (i, j) spans [i * cell_size, (i + 1) * cell_size) horizontally, same for j.
+    '''
+    return np.floor(meters / cell_size).astype(np.int64)
+
+def hex_cells(meters: np.ndarray, cell_size: float) -> np.ndarray:
+    '''
+    (N, 2) integer axial (q, r) indices of pointy-top hexagons, `cell_size`
+    being the flat-to-flat width. Cell (q, r) is centered on
+    x = cell_size * (q + r / 2), y = cell_size * sqrt(3) / 2 * r.
+    '''
+    radius = cell_size / SQRT3
+    q = (SQRT3 / 3 * meters[:, 0] - meters[:, 1] / 3) / radius
+    r = (2 / 3 * meters[:, 1]) / radius
+    
+    # Cube rounding: fix the coordinate with the largest rounding error
+    cube = np.column_stack([q, -q - r, r])
+    rounded = np.round(cube)
+    diff = np.abs(rounded - cube)
+    worst = diff.argmax(axis=1)
+    rows = np.arange(len(cube))
+    rounded[rows, worst] = 0
+    rounded[rows, worst] = -rounded.sum(axis=1)
+    
+    return rounded[:, [0, 2]].astype(np.int64)
+
+def count_cells(cells: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Counts points per cell with a single bincount over a dense local grid.
+    Returns the non-empty cells (M, 2) and their counts (M,).
+    '''
+    if len(cells) == 0:
+        return np.empty((0, 2), dtype=np.int64), np.empty(0, dtype=np.int64)
+    
+    low = cells.min(axis=0)
+    local = cells - low
+    width = local[:, 0].max() + 1
+    counts = np.bincount(local[:, 1] * width + local[:, 0])
+    
+    occupied = np.flatnonzero(counts)
+    return np.column_stack([occupied % width, occupied // width]) + low, counts[occupied]
+
+def cell_polygons(
+    cells: np.ndarray,
+    cell_size: float,
+    grid: str='square'
+) -> np.ndarray:
+    '''
+    Closed rings of the cells in METRIC_CRS, shape (M, vertices + 1, 2).
+    '''
+    if grid == 'hex':
+        centers = np.column_stack([
+            cell_size * (cells[:, 0] + cells[:, 1] / 2),
+            cell_size * SQRT3 / 2 * cells[:, 1]
+        ])
+        angles = np.radians(30 + 60 * np.arange(7))
+        offsets = np.column_stack([np.cos(angles), np.sin(angles)]) * cell_size / SQRT3
+    else:
+        centers = (cells + 0.5) * cell_size
+        offsets = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1], [-1, -1]]) * cell_size / 2
+    
+    return centers[:, None, :] + offsets[None, :, :]
+
+def density_json(
+    meters: np.ndarray,
+    cell_size: float,
+    grid: str='square'
+) -> str:
+    '''
+    Compact density grid: parallel arrays of cell indices and counts.
+    '''
+    cells_fn = hex_cells if grid == 'hex' else square_cells
+    cells, counts = count_cells(cells_fn(meters, cell_size))
+    return json.dumps({
+        'grid': grid,
+        'cell_size': cell_size,
+        'crs': METRIC_CRS,
+        'i': cells[:, 0].tolist(),
+        'j': cells[:, 1].tolist(),
+        'count': counts.tolist()
+    })
+
+def density_geojson(
+    meters: np.ndarray,
+    cell_size: float,
+    grid: str='square'
+) -> str:
+    '''
+    Density grid as a GeoJSON FeatureCollection of cell polygons (in CRS) with counts.
+    '''
+    cells_fn = hex_cells if grid == 'hex' else square_cells
+    cells, counts = count_cells(cells_fn(meters, cell_size))
+    rings = cell_polygons(cells, cell_size, grid)
+    
+    transformer = Transformer.from_crs(METRIC_CRS, CRS, always_xy=True)
+    lon, lat = transformer.transform(rings[..., 0].ravel(), rings[..., 1].ravel())
+    rings = np.stack([lon, lat], axis=-1).reshape(rings.shape).round(6)
+    
+    features = [
+        {
+            'type': 'Feature',
+            'properties': {'i': int(i), 'j': int(j), 'count': int(count)},
+            'geometry': {'type': 'Polygon', 'coordinates': [ring.tolist()]}
+        }
+        for (i, j), count, ring in zip(cells, counts, rings)
+    ]
+    return json.dumps({'type': 'FeatureCollection', 'features': features})
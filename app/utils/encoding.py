@@ -0,0 +1,83 @@
+import gzip
+
+from dataclasses import dataclass
+from typing import Optional
+from fastapi.responses import Response
+
+from app.config import *
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GEOJSON_MEDIA_TYPE = 'application/geo+json'
+
+@dataclass(frozen=True)
+class EncodedPayload:
+    '''
+    Serialized response body, with optional pre-compressed variants.
+    '''
+    raw: bytes
+    gzip: Optional[bytes] = None
+    br: Optional[bytes] = None
+    
+    @property
+    def nbytes(self) -> int:
+        return sum(len(body) for body in (self.raw, self.gzip, self.br) if body is not None)
+
+def encode_payload(data: str | bytes) -> EncodedPayload:
+    '''
+    Encodes a response body once, so that cache hits can be served as-is.
+    Brotli is only used if the optional `brotli` package is installed.
+    '''
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    
+    if not PRECOMPRESS:
+        return EncodedPayload(raw=data)
+    
+    return EncodedPayload(
+        raw=data,
+        gzip=gzip.compress(data, compresslevel=GZIP_LEVEL),
+        br=brotli.compress(data, quality=BROTLI_QUALITY) if brotli is not None else None
+    )
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    '''
+    Codings of an Accept-Encoding header, without those refused with `q=0`.
+    '''
+    accepted = set()
+    for token in accept_encoding.lower().split(','):
+        coding, *params = [part.strip() for part in token.split(';')]
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding)
+    return accepted
+
+def payload_response(
+    payload: EncodedPayload,
+    accept_encoding: str='',
+    media_type: str=GEOJSON_MEDIA_TYPE
+) -> Response:
+    '''
+    Picks the best pre-encoded variant accepted by the client.
+    '''
+    accepted = accepted_encodings(accept_encoding)
+    headers = {'Vary': 'Accept-Encoding'}
+    
+    if payload.br is not None and 'br' in accepted:
+        headers['Content-Encoding'] = 'br'
+        return Response(content=payload.br, media_type=media_type, headers=headers)
+    
+    if payload.gzip is not None and 'gzip' in accepted:
+        headers['Content-Encoding'] = 'gzip'
+        return Response(content=payload.gzip, media_type=media_type, headers=headers)
+    
+    return Response(content=payload.raw, media_type=media_type, headers=headers)
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+def build_activity_index(
+    gdf: pd.DataFrame,
+    column: str
+) -> dict[str, tuple[int, int]]:
+    '''
+    Maps each activity value to its contiguous (start, stop) row range.
+    Expects the frame to be sorted by `column`, missing values last (see load_data).
+    '''
+    values = gdf[column].to_numpy()
+    n_valid = int(pd.notna(values).sum())
+    if n_valid == 0:
+        return {}
+    
+    values = values[:n_valid]
+    breaks = np.flatnonzero(values[1:] != values[:-1]) + 1
+    starts = np.concatenate(([0], breaks))
+    stops = np.concatenate((breaks, [n_valid]))
+    
+    return {values[start]: (int(start), int(stop)) for start, stop in zip(starts, stops)}
+
+def select_positions(
+    index: dict[str, tuple[int, int]],
+    codes
+) -> np.ndarray:
+    '''
+    Returns the sorted row positions of every requested code.
+    Unknown codes are ignored.
+    '''
+    ranges = sorted(index[code] for code in set(codes) if code in index)
+    if not ranges:
+        return np.empty(0, dtype=np.int64)
+    
+    return np.concatenate([np.arange(start, stop) for start, stop in ranges])
@@ -0,0 +1,142 @@
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Optional
+
+from app.config import *
+
+logger = logging.getLogger('gunicorn.error')
+
+class QueueFull(Exception):
+    pass
+
+@dataclass
+class Job:
+    id: str
+    key: Hashable
+    future: Future
+    created: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    
+    @property
+    def status(self) -> str:
+        if self.finished is not None:
+            return 'failed' if self.error is not None else 'done'
+        return 'running' if self.future.running() else 'queued'
+
+class JobQueue:
+    '''
+    Runs heavy computations in a bounded process pool, off the request path.
+    Identical in-flight (or recently finished) jobs are deduplicated by key.
+    '''
+    def __init__(
+        self,
+        max_workers: int=CLUSTER_WORKERS,
+        max_pending: int=CLUSTER_MAX_PENDING,
+        ttl: float=JOB_TTL
+    ):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        
+        self._executor = None
+        self._jobs: dict[str, Job] = {}
+        self._by_key: dict[Hashable, str] = {}
+        self._lock = threading.Lock()
+    
+    def submit(
+        self,
+        key: Hashable,
+        fn: Callable,
+        *args,
+        finalize: Optional[Callable[[Any], Any]]=None
+    ) -> Job:
+        '''
+        Schedules fn(*args) in the pool, unless an identical job exists.
+        `finalize` runs in this process on the worker's result (e.g. to cache it).
+        Raises QueueFull when too many jobs are pending.
+        '''
+        with self._lock:
+            self._purge()
+            existing = self._existing(key)
+            if existing is not None:
+                return existing
+            
+            pending = sum(1 for job in self._jobs.values() if job.finished is None)
+            if pending >= self.max_pending:
+                raise QueueFull(f'{pending} clustering jobs already pending.')
+            
+            if self._executor is None:
+                # Spawned, not forked: workers do not inherit the server's threads and locks
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            
+            job = self._register(key, self._executor.submit(fn, *args))
+        
+        job.future.add_done_callback(lambda future: self._finish(job, future, finalize))
+        return job
+    
+    def add_result(self, key: Hashable, result: Any) -> Job:
+        '''
+        Registers an already available result (e.g. a cache hit) as a finished job.
+        '''
+        future = Future()
+        future.set_result(result)
+        
+        with self._lock:
+            self._purge()
+            existing = self._existing(key)
+            if existing is not None:
+                return existing
+            job = self._register(key, future)
+            job.result = result
+            job.finished = time.time()
+        return job
+    
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def _existing(self, key: Hashable) -> Optional[Job]:
+        # Caller holds the lock. Failed jobs are retried.
+        job = self._jobs.get(self._by_key.get(key))
+        if job is not None and job.status != 'failed':
+            return job
+        return None
+    
+    def _register(self, key: Hashable, future: Future) -> Job:
+        # Caller holds the lock
+        job = Job(id=uuid.uuid4().hex, key=key, future=future)
+        self._jobs[job.id] = job
+        self._by_key[key] = job.id
+        return job
+    
+    def _finish(self, job: Job, future: Future, finalize: Optional[Callable]):
+        try:
+            result = future.result()
+            job.result = finalize(result) if finalize is not None else result
+        except Exception as e:
+            logger.error(f'Job {job.id} failed: {e}')
+            job.error = str(e)
+        job.finished = time.time()
+    
+    def _purge(self):
+        # Caller holds the lock
+        now = time.time()
+        expired = [
+            job for job in self._jobs.values()
+            if job.finished is not None and now - job.finished > self.ttl
+        ]
+        for job in expired:
+            del self._jobs[job.id]
+            if self._by_key.get(job.key) == job.id:
+                del self._by_key[job.key]
@@ -1,32 +1,189 @@
 import geopandas as gpd
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+import numpy as np
 
 import io
 
+from functools import lru_cache
+from matplotlib import colormaps
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import to_rgb
+from matplotlib.figure import Figure
+from PIL import Image
+
 from app.config import *
+from app.utils.cache import ResultCache
+
+# Shared by the matplotlib and raster paths, so both render the same map
+CLUSTER_PALETTE = np.array(colormaps['tab20'].colors)
+NOISE_COLOR = '#808080'
+POINT_ALPHA = 0.7
+# Pixel indices held at once by rasterize_points (bounds its memory, ~100 MB)
+RASTER_BATCH = 1 << 22
+
+@lru_cache(maxsize=1)
+def load_city() -> gpd.GeoDataFrame:
+    '''
+    City outline in METRIC_CRS, used as the base layer of static maps.
+    '''
+    return gpd.read_file(CITY_FILE).to_crs(METRIC_CRS)
+
+def map_extent(
+    width: int,
+    height: int,
+    padding: float=0.02
+) -> tuple[float, float, float, float]:
+    '''
+    Extent of the city outline (in METRIC_CRS), padded and widened to the image aspect ratio.
+    '''
+    minx, miny, maxx, maxy = load_city().total_bounds
+    span_x, span_y = (maxx - minx) * (1 + 2 * padding), (maxy - miny) * (1 + 2 * padding)
+    span_x, span_y = max(span_x, span_y * width / height), max(span_y, span_x * height / width)
+    cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+    return cx - span_x / 2, cy - span_y / 2, cx + span_x / 2, cy + span_y / 2
+
+def point_colors(labels: np.ndarray) -> np.ndarray:
+    '''
+    RGB colours (0-1) of labelled points: one palette entry per cluster, grey for noise.
+    '''
+    colors = CLUSTER_PALETTE[labels % len(CLUSTER_PALETTE)]
+    colors[labels == -1] = to_rgb(NOISE_COLOR)
+    return colors
 
 def plot_geodata(
     gdf: gpd.GeoDataFrame,
     overlay: dict[str, gpd.GeoDataFrame],
-    marker_size: int=2.0
-) -> gpd.GeoDataFrame:
-    fig, ax = plt.subplots(figsize=(12, 12))
-        
-    if 'cluster' in gdf.columns:
-        clustered=gdf[gdf['cluster'] != -1]
-        noise = gdf[gdf['cluster'] == -1]
-        clustered.plot(ax=ax, column='cluster', categorical=True,
-                    cmap='Set3', markersize=marker_size, alpha=0.7)
-        noise.plot(ax=ax, color='grey', markersize=marker_size, alpha=0.5)
-    elif not gdf.empty:
-        gdf.plot(ax=ax, color=DOT_COLOR, markersize=marker_size, alpha=0.7)
-        
+    marker_size: float=2.0,
+    width: int=1200,
+    height: int=1200,
+    dpi: int=100,
+    fmt: str='png',
+    extent: tuple[float, float, float, float]=None
+) -> bytes:
+    '''
+    Renders points over the overlay boundaries. `marker_size` is the dot diameter in pixels.
+    Uses an Agg canvas per call rather than pyplot, whose global state is not thread-safe.
+    '''
+    fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    
+    for layer in overlay.values():
+        layer.boundary.plot(ax=ax, color=EDGE_COLOR, linewidth=1)
+    
+    if not gdf.empty:
+        if 'cluster' in gdf.columns:
+            # Noise first, so that clusters are drawn on top
+            labels = gdf['cluster'].to_numpy()
+            gdf = gdf.iloc[np.argsort(labels != -1, kind='stable')]
+            colors = point_colors(gdf['cluster'].to_numpy())
+        else:
+            colors = DOT_COLOR
+        # Scatter sizes are areas in points^2
+        ax.scatter(
+            gdf.geometry.x, gdf.geometry.y, c=colors,
+            s=(marker_size * 72 / dpi) ** 2, alpha=POINT_ALPHA, linewidths=0
+        )
+    
+    if extent is not None:
+        ax.set_xlim(extent[0], extent[2])
+        ax.set_ylim(extent[1], extent[3])
     ax.axis('off')
     
     buf = io.BytesIO()
-    fig.savefig(buf, format='png', dpi=1500, bbox_inches='tight')
-    buf.seek(0)
+    fig.savefig(buf, format=fmt, dpi=dpi, facecolor=BACKGROUND_COLOR)
+    return buf.getvalue()
+
+# Frames of up to 4096x4096 RGBA: counted in the shared CACHE_MAX_BYTES budget
+BASE_LAYER_CACHE = ResultCache('base_layers', disk=False)
+
+@BASE_LAYER_CACHE.memoize
+def base_layer(width: int, height: int) -> np.ndarray:
+    '''
+    RGBA (height, width, 4) rendering of the city outline, cached per resolution.
+    '''
+    fig = Figure(figsize=(width / 100, height / 100), dpi=100, facecolor=BACKGROUND_COLOR)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    load_city().boundary.plot(ax=ax, color=EDGE_COLOR, linewidth=1)
+    extent = map_extent(width, height)
+    ax.set_xlim(extent[0], extent[2])
+    ax.set_ylim(extent[1], extent[3])
+    ax.axis('off')
+    canvas.draw()
+    image = np.asarray(canvas.buffer_rgba())[:height, :width].copy()
+    
+    image.setflags(write=False)
+    return image
+
+def rasterize_points(
+    meters: np.ndarray,
+    labels: np.ndarray=None,
+    width: int=1200,
+    height: int=1200,
+    marker_size: float=2.0,
+    fmt: str='png'
+) -> bytes:
+    '''
+    Renders points (in METRIC_CRS) directly into a pixel grid with NumPy,
+    on top of the cached base layer: cost is linear in the number of points
+    times the dot area. Dots have the size, colours and opacity of plot_geodata:
+    each pixel takes the colour of its top dot, and the opacity of all the dots stacked on it.
+    '''
+    minx, miny, maxx, maxy = map_extent(width, height)
+    px = ((meters[:, 0] - minx) / (maxx - minx) * width).astype(np.int64)
+    py = ((maxy - meters[:, 1]) / (maxy - miny) * height).astype(np.int64)
+    
+    if labels is not None:
+        # Noise first, so that clusters are drawn on top
+        order = np.argsort(labels != -1, kind='stable')
+        px, py, labels = px[order], py[order], labels[order]
+    
+    radius = marker_size / 2
+    span = int(radius)
+    # Disc of the dots: pixels with dx^2 + dy^2 <= radius * (radius + 1)
+    rows = np.arange(-span, span + 1)
+    half = np.floor(np.sqrt(radius * (radius + 1) - rows * rows)).astype(np.int64)
     
-    return buf.getvalue()
\ No newline at end of file
+    # Each dot is one horizontal run per disc row, added to a difference array:
+    # the cumulative sum along rows gives the dots covering each pixel
+    y = (py[None, :] + rows[:, None]).ravel()
+    x0 = np.clip(px[None, :] - half[:, None], 0, width).ravel()
+    x1 = np.clip(px[None, :] + half[:, None] + 1, 0, width).ravel()
+    keep = (y >= 0) & (y < height) & (x0 < x1)
+    delta = np.zeros((height, width + 1), dtype=np.int32)
+    np.add.at(delta, (y[keep], x0[keep]), 1)
+    np.subtract.at(delta, (y[keep], x1[keep]), 1)
+    counts = np.cumsum(delta, axis=1, dtype=np.int32)[:, :width].ravel()
+    
+    top = None
+    if labels is not None:
+        # Last dot drawn on each pixel, which gives its colour. Disc offsets are processed
+        # in batches of at most RASTER_BATCH pixel indices (cost: points x dot area)
+        dx, dy = np.mgrid[-span:span + 1, -span:span + 1].reshape(2, -1)
+        disc = dx * dx + dy * dy <= radius * (radius + 1)
+        dx, dy = dx[disc], dy[disc]
+        top = np.full(width * height, -1, dtype=np.int32)
+        rank = np.arange(len(px), dtype=np.int32)
+        batch = max(1, RASTER_BATCH // max(len(px), 1))
+        for start in range(0, len(dx), batch):
+            x = (px[None, :] + dx[start:start + batch, None]).ravel()
+            y = (py[None, :] + dy[start:start + batch, None]).ravel()
+            inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+            ranks = np.broadcast_to(rank, (len(dx[start:start + batch]), len(rank))).ravel()
+            np.maximum.at(top, y[inside] * width + x[inside], ranks[inside])
+    
+    image = base_layer(width, height).copy()
+    rgb = image[..., :3].reshape(-1, 3)
+    
+    drawn = np.flatnonzero(counts)
+    if labels is None:
+        color = np.array(to_rgb(DOT_COLOR)) * 255
+    else:
+        color = point_colors(labels[top[drawn]]) * 255
+    # Opacity of `count` stacked translucent dots
+    alpha = (1 - (1 - POINT_ALPHA) ** counts[drawn])[:, None]
+    rgb[drawn] = (alpha * color + (1 - alpha) * rgb[drawn]).astype(np.uint8)
+    
+    buf = io.BytesIO()
+    Image.fromarray(image, 'RGBA').save(buf, format=fmt.upper())
+    return buf.getvalue()
@@ -0,0 +1,39 @@
+import threading
+
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable
+
+class SingleFlight:
+    '''
+    Coalesces concurrent calls with the same key: the first caller computes,
+    the others wait on the same future and share its result (or exception).
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, Future] = {}
+    
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> tuple[Any, bool]:
+        '''
+        Returns (result, shared), `shared` being True for callers that waited
+        on another caller's computation.
+        '''
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        
+        if not leader:
+            return future.result(), True
+        
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
@@ -0,0 +1,76 @@
+import numpy as np
+
+from pyproj import Transformer
+from scipy.spatial import cKDTree
+
+from app.config import *
+
+class SpatialIndex:
+    '''
+    KD-tree over the projected (metric) master coordinates, built once at startup.
+    Queries return sorted row positions, ready to intersect with an
+    activity selection (see app/utils/indexing.py).
+    '''
+    def __init__(
+        self,
+        lonlat: np.ndarray,
+        meters: np.ndarray
+    ):
+        self.lonlat = lonlat
+        self.meters = meters
+        self.tree = cKDTree(meters) if len(meters) else None
+        self._to_meters = Transformer.from_crs(CRS, METRIC_CRS, always_xy=True)
+        
+        if len(lonlat):
+            self.extent = (*lonlat.min(axis=0), *lonlat.max(axis=0))
+        else:
+            self.extent = (0.0, 0.0, 0.0, 0.0)
+    
+    def within_bbox(
+        self,
+        min_lon: float,
+        min_lat: float,
+        max_lon: float,
+        max_lat: float
+    ) -> np.ndarray:
+        '''
+        Positions of the points inside a lon/lat bounding box.
+        '''
+        # Clip to the data extent: empty or far-away boxes cost nothing
+        min_lon, min_lat = max(min_lon, self.extent[0]), max(min_lat, self.extent[1])
+        max_lon, max_lat = min(max_lon, self.extent[2]), min(max_lat, self.extent[3])
+        if self.tree is None or min_lon > max_lon or min_lat > max_lat:
+            return np.empty(0, dtype=np.int64)
+        
+        # A lon/lat box is not a rectangle once projected: query the ball enclosing
+        # a sampled grid of the box, then filter exactly in lon/lat
+        lons, lats = np.meshgrid(
+            np.linspace(min_lon, max_lon, 5),
+            np.linspace(min_lat, max_lat, 5)
+        )
+        x, y = self._to_meters.transform(lons.ravel(), lats.ravel())
+        center = ((x.min() + x.max()) / 2, (y.min() + y.max()) / 2)
+        # Small margin for the curvature of the box edges between samples
+        radius = np.hypot(x - center[0], y - center[1]).max() * 1.01 + 1.0
+        
+        candidates = np.asarray(self.tree.query_ball_point(center, radius), dtype=np.int64)
+        lon, lat = self.lonlat[candidates, 0], self.lonlat[candidates, 1]
+        inside = (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+        
+        return np.sort(candidates[inside])
+
+    
+    def within_radius(
+        self,
+        lon: float,
+        lat: float,
+        radius_m: float
+    ) -> np.ndarray:
+        '''
+        Positions of the points within `radius_m` meters of a lon/lat location.
+        '''
+        if self.tree is None:
+            return np.empty(0, dtype=np.int64)
+        
+        center = self._to_meters.transform(lon, lat)
+        return np.sort(np.asarray(self.tree.query_ball_point(center, radius_m), dtype=np.int64))
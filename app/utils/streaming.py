@@ -0,0 +1,56 @@
+import json
+import numpy as np
+import pandas as pd
+
+from typing import Iterator, Optional
+
+from app.config import *
+
+# RFC 8142: each GeoJSON text sequence record starts with a record separator
+RECORD_SEPARATOR = '\x1e'
+
+STREAM_MEDIA_TYPES = {
+    'geojsonseq': 'application/geo+json-seq',
+    'ndjson': 'application/x-ndjson'
+}
+
+def iter_features(
+    df: pd.DataFrame,
+    lonlat: np.ndarray,
+    positions: np.ndarray,
+    labels: Optional[np.ndarray]=None,
+    record_separator: str='',
+    chunk_size: int=STREAM_CHUNK_SIZE
+) -> Iterator[bytes]:
+    '''
+    Yields the selected rows as newline-delimited GeoJSON Features, one chunk at a time.
+    Each chunk is built straight from column arrays, so memory stays bounded
+    by `chunk_size` regardless of the selection size.
+    '''
+    columns = [column for column in df.columns if column not in ('lon', 'lat')]
+    
+    for start in range(0, len(positions), chunk_size):
+        chunk = positions[start:start + chunk_size]
+        rows = df.iloc[chunk]
+        
+        properties = {
+            column: rows[column].astype(object).where(rows[column].notna(), None).tolist()
+            for column in columns
+        }
+        if labels is not None:
+            properties['cluster'] = labels[start:start + chunk_size].tolist()
+        
+        ids = rows.index.astype(str).tolist()
+        coords = lonlat[chunk].tolist()
+        
+        lines = []
+        for i, feature_id in enumerate(ids):
+            feature = {
+                'id': feature_id,
+                'type': 'Feature',
+                'properties': {column: values[i] for column, values in properties.items()},
+                'geometry': {'type': 'Point', 'coordinates': coords[i]}
+            }
+            lines.append(record_separator + json.dumps(feature) + '\n')
+        
+        yield ''.join(lines).encode('utf-8')
@@ -0,0 +1,87 @@
+import numpy as np
+import pyarrow as pa
+
+from typing import Optional
+
+from app.config import *
+from app.utils.binary import table_to_ipc
+
+MAX_ZOOM = 22
+
+def tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    '''
+    Lon/lat bounds (min_lon, min_lat, max_lon, max_lat) of a Web Mercator (XYZ) tile.
+    '''
+    n = 2 ** z
+    min_lon = x / n * 360.0 - 180.0
+    max_lon = (x + 1) / n * 360.0 - 180.0
+    max_lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y / n))))
+    min_lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + 1) / n))))
+    return min_lon, float(min_lat), max_lon, float(max_lat)
+
+def mercator_coordinates(lonlat: np.ndarray) -> np.ndarray:
+    '''
+    Normalized Web Mercator coordinates in [0, 1] (y pointing south), shape (N, 2).
+    '''
+    lat = np.radians(lonlat[:, 1])
+    mx = (lonlat[:, 0] + 180.0) / 360.0
+    my = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0
+    return np.ascontiguousarray(np.column_stack([mx, my]))
+
+def build_tile(
+    mercator: np.ndarray,
+    positions: np.ndarray,
+    z: int,
+    x: int,
+    y: int,
+    names: Optional[pa.Array]=None,
+    labels: Optional[np.ndarray]=None
+) -> bytes:
+    '''
+    Encodes the points of a tile as an Arrow IPC stream with tile-local
+    uint16 `x`/`y` coordinates (0 to TILE_EXTENT) and a `count` column.
+    
+    Below TILE_AGGREGATE_ZOOM, points are aggregated into a TILE_GRID x TILE_GRID
+    grid: one row per non-empty cell (and cluster, if labels are given),
+    located at the mean position of its points.
+    From TILE_AGGREGATE_ZOOM on, points are raw and carry their name.
+    '''
+    n = 2 ** z
+    tile_xy = (mercator[positions] * n - (x, y)) * TILE_EXTENT
+    tile_xy = np.clip(tile_xy, 0, TILE_EXTENT - 1)
+    
+    if z < TILE_AGGREGATE_ZOOM:
+        cell = (tile_xy // (TILE_EXTENT / TILE_GRID)).astype(np.int64)
+        keys = cell[:, 1] * TILE_GRID + cell[:, 0]
+        if labels is not None:
+            # One aggregate per (cell, cluster); noise (-1) shifted to 0
+            keys = keys * (labels.max() + 2) + (labels + 1)
+        
+        unique_keys, group, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        columns = {
+            'x': np.bincount(group, weights=tile_xy[:, 0]) / counts,
+            'y': np.bincount(group, weights=tile_xy[:, 1]) / counts,
+            'count': counts
+        }
+        if labels is not None:
+            columns['cluster'] = unique_keys % (labels.max() + 2) - 1
+    else:
+        columns = {
+            'x': tile_xy[:, 0],
+            'y': tile_xy[:, 1],
+            'count': np.ones(len(positions))
+        }
+        if labels is not None:
+            columns['cluster'] = labels
+    
+    table = pa.table({
+        'x': pa.array(columns['x'].astype(np.uint16)),
+        'y': pa.array(columns['y'].astype(np.uint16)),
+        'count': pa.array(columns['count'].astype(np.uint32))
+    })
+    if 'cluster' in columns:
+        table = table.append_column('cluster', pa.array(columns['cluster'].astype(np.int32)))
+    if z >= TILE_AGGREGATE_ZOOM and names is not None:
+        table = table.append_column(NAME_COL, names.take(pa.array(positions)).dictionary_encode())
+    
+    return table_to_ipc(table)
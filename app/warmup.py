@@ -0,0 +1,55 @@
+import logging
+import threading
+import time
+
+from app.config import *
+from app.routes.map import (
+    MASTER_DF,
+    geojson_key,
+    get_points_payload,
+    get_processed_clusters
+)
+from app.utils.codes import list_codes
+
+logger = logging.getLogger('gunicorn.error')
+
+WARMUP_STATE = {
+    'ready': not WARMUP,
+    'done': 0,
+    'total': 0
+}
+
+def warm_up():
+    '''
+    Precomputes the unclustered GeoJSON and binary points payloads of every
+    clean category, plus their clustered GeoJSON for the frontend's default
+    slider values. Results land in the result caches (and in CACHE_DIR if set,
+    which can be shipped as a prebuilt artifact directory).
+    '''
+    codes = [code for code in list_codes(MASTER_DF) if isinstance(code, str)]
+    WARMUP_STATE['total'] = len(codes)
+    start = time.time()
+    
+    for code in codes:
+        try:
+            get_processed_clusters(*geojson_key([code], False, 0.0, 0))
+            get_points_payload((code,), (), False, 0.0, 0)
+            if WARMUP_CLUSTERING:
+                get_processed_clusters(*geojson_key([code], True, WARMUP_EPS, WARMUP_MIN_SAMPLES))
+        except Exception as e:
+            logger.error(f'Warm-up failed for {code}: {e}')
+        WARMUP_STATE['done'] += 1
+    
+    WARMUP_STATE['ready'] = True
+    logger.info(f'Warm-up complete: {len(codes)} categories in {time.time() - start:.1f}s.')
+
+def start_warmup():
+    '''
+    Runs the warm-up in a background thread if WARMUP is enabled.
+    '''
+    if WARMUP:
+        threading.Thread(target=warm_up, name='warmup', daemon=True).start()
+
+if __name__ == '__main__':
+    # Prebuild the cache artifacts, e.g. at image build time with CACHE_DIR set
+    warm_up()
@@ -0,0 +1,90 @@
+import numpy as np
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+from app.config import *
+
+def text_key(text: str) -> str:
+    '''
+    Stable key of a string in the store.
+    '''
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+class EmbeddingStore:
+    '''
+    Persistent sentence embeddings for one model.
+    Vectors are rows of a memory-mapped `.npy` matrix, located through a
+    JSON index {sha1(text): row}. Only strings never seen before are encoded,
+    and the model itself is only loaded when there is something to encode.
+    '''
+    def __init__(self, directory: Path, model_name: str='all-MiniLM-L6-v2'):
+        slug = re.sub(r'[^\w.-]', '_', model_name)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        self.model_name = model_name
+        self.matrix_path = directory / f'{slug}.npy'
+        self.index_path = directory / f'{slug}.index.json'
+        self._model = None
+
+        self.index = json.loads(self.index_path.read_text()) if self.index_path.exists() else {}
+        self.matrix = np.load(self.matrix_path, mmap_mode='r') if self.matrix_path.exists() else None
+
+        if self.matrix is not None and len(self.matrix) != len(self.index):
+            # Interrupted write: start over rather than serve misaligned rows
+            self.index, self.matrix = {}, None
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def encode(self, texts: list[str], show_progress_bar: bool=False) -> np.ndarray:
+        '''
+        Embeddings of `texts` (float32, one row per text, in order).
+        Missing strings are encoded in one batch and appended to the store.
+        '''
+        keys = [text_key(text) for text in texts]
+        missing = list({key: text for key, text in zip(keys, texts) if key not in self.index}.items())
+
+        if missing:
+            vectors = self.model.encode(
+                [text for _, text in missing],
+                show_progress_bar=show_progress_bar
+            ).astype(np.float32)
+            self._append([key for key, _ in missing], vectors)
+
+        if not texts:
+            return np.empty((0, 0 if self.matrix is None else self.matrix.shape[1]), dtype=np.float32)
+
+        return np.asarray(self.matrix[[self.index[key] for key in keys]])
+
+    def _append(self, keys: list[str], vectors: np.ndarray):
+        '''
+        Writes the grown matrix and index next to the old ones, then swaps them in.
+        The matrix is replaced first: a stale index is detected on load.
+        '''
+        matrix = vectors if self.matrix is None else np.concatenate([self.matrix, vectors])
+        index = dict(self.index)
+        index.update({key: row for row, key in enumerate(keys, start=len(index))})
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.matrix_path.parent, suffix='.npy')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, matrix)
+        os.replace(tmp_path, self.matrix_path)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.index_path.parent, suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+        self.index = index
+        self.matrix = np.load(self.matrix_path, mmap_mode='r')
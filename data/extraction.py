@@ -1,13 +1,16 @@
-import geopandas as gpd
 import pandas as pd
 import typer
+import hashlib
 import re
 import shutil
 
 from termcolor import colored
 from sklearn.cluster import AgglomerativeClustering
-from sentence_transformers import SentenceTransformer
 from app.config import *
+from app.utils.areas import assign_areas
+from data.embeddings import EmbeddingStore
+from data.manifest import load_manifest, save_manifest, update_digest
+from data.reader import CHUNK_SIZE, ParquetAppender, count_values, iter_licences
 
 app = typer.Typer()
 
@@ -21,13 +24,25 @@ def main(
         RAW_COMPANY_DATA, 
         '--input', 
         '-i', 
-        help='Path to the raw GeoJSON company data file.'
+        help='Path to the raw company data file (GeoJSON, GeoParquet or CSV).'
     ),
     output_dir: Path = typer.Option(
         DATA_DIR, 
         '--output', 
         '-o', 
         help = 'Directory to save the processed parquet files.'
+    ),
+    embeddings_dir: Path = typer.Option(
+        RAW_DATA / 'embeddings',
+        '--embeddings',
+        '-e',
+        help='Directory of the persistent embedding store (only new strings are encoded).'
+    ),
+    chunk_size: int = typer.Option(
+        CHUNK_SIZE,
+        '--chunk-size',
+        '-c',
+        help='Rows read at once from the raw file (bounds peak memory).'
     )
 ):
     '''
@@ -35,25 +50,22 @@ def main(
     This script extracts the business activity IDs and saves the data into separate Parquet files for each ID.
     An index file is written with all unique IDs and associated label.
     '''
-    # --- 1. Loading Data ---
-    
-    print(colored(f'Processing raw GeoJSON file: {input_file}', 'blue', attrs=['bold']))
-    df = gpd.read_file(input_file)
+    # --- 1. Scanning Data ---
+    # The raw file is read twice in chunks, never as a whole:
+    # unique activities and their counts first, then the rows themselves
     
-    clean_df = df.loc[:, [ACT_COL, NAME_COL, 'geometry']].copy()
+    print(colored(f'Scanning raw company data: {input_file}', 'blue', attrs=['bold']))
+    activity_counts = count_values(input_file, DESC_COL, chunk_size)
     
     # --- 2. NLP Clustering ---
     
     print(colored('Running semantic clustering...', 'yellow'))
     
     # Extracting unique raw description
-    unique_activities = clean_df[DESC_COL].dropna().unique().tolist()
+    unique_activities = list(activity_counts)
     
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    embeddings = model.encode(
-        unique_activities, 
-        show_progress_bar=True
-    )
+    store = EmbeddingStore(embeddings_dir, 'all-MiniLM-L6-v2')
+    embeddings = store.encode(unique_activities, show_progress_bar=True)
     
     clustering = AgglomerativeClustering(
         n_clusters=None,
@@ -70,8 +82,6 @@ def main(
     })
     
     print(colored('Consolidating Labels based on Frequency...', 'yellow'))
-    activity_counts = clean_df[DESC_COL].value_counts().to_dict()
-    
     for cluster_id in temp_df['cluster'].unique():
         members = temp_df[temp_df['cluster'] == cluster_id]['text'].tolist()
         clean_label = max(members, key=lambda x: activity_counts.get(x, 0))
@@ -79,13 +89,35 @@ def main(
         for member in members:
             cluster_map[member] = clean_label
     
-    clean_df['clean_activity'] = clean_df[DESC_COL].map(cluster_map)
+    # --- 3. Labelling Chunks ---
+    # Each chunk is mapped, joined to community areas & neighborhoods and appended to a staging file
+    print(colored('Labelling licences and joining community areas and neighborhoods...', 'yellow'))
     
-    # --- 3. Saving Consolidated GDF ---
-    unique_clean_labels = clean_df['clean_activity'].unique()
+    master_name = 'chicago_licenses_master.parquet'
+    staging_path = output_dir.parent / f'.{master_name}.tmp'
+    output_dir.parent.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha1()
     
-    print(f'Total records: {len(clean_df):,d}.')
+    with ParquetAppender(staging_path) as writer:
+        for chunk in iter_licences(input_file, [ACT_COL, NAME_COL, DESC_COL], chunk_size):
+            chunk['clean_activity'] = chunk[DESC_COL].map(cluster_map)
+            chunk = assign_areas(chunk)
+            update_digest(digest, chunk)
+            writer.append(chunk)
+    
+    # --- 4. Saving Consolidated GDF ---
+    unique_clean_labels = set(cluster_map.values())
+    
+    print(f'Total records: {writer.rows:,d}.')
     print(f'Reduced {len(unique_activities):,d} raw categories -> {len(unique_clean_labels):,d} semantic clusters substitued.')
+    
+    # Nothing to rewrite if the master file did not change since the last run
+    digest = digest.hexdigest()
+    if load_manifest(output_dir).get(master_name) == digest and (output_dir / master_name).exists():
+        staging_path.unlink()
+        print(colored('Master file is up to date.', 'green', attrs=['bold']))
+        return
+    
     print(f'Saving master file to {output_dir}...')
     
     if output_dir.exists():
@@ -97,10 +129,10 @@ def main(
     output_dir.mkdir(parents=True, exist_ok=True)
     
     # Processing records by activity code
-    output_path = DATA_DIR / 'chicago_licenses_master.parquet'
-    gpd.GeoDataFrame(clean_df).to_parquet(output_path)
+    output_path = DATA_DIR / master_name
+    shutil.move(staging_path, output_path)
     
-    # --- 4. Creating the Index File ---
+    # --- 5. Creating the Index File ---
     index_df = pd.DataFrame({
         'raw_activity': list(cluster_map.keys()),
         'clean_activity': list(cluster_map.values())
@@ -108,9 +140,12 @@ def main(
 
     index_path = DATA_DIR / f'cluster_index.csv'
     index_df.to_csv(index_path, index=False)
+    save_manifest(output_dir, {master_name: digest})
     
     print(f'Cluster index saved to {index_path}.')
     print(colored('Processing complete.', 'green', attrs=['bold']))
+    # Not done here: the conversion loads the whole master file in memory
+    print('Run data/to_arrow.py to build the memory-mapped Arrow file used by the backend.')
     
 if __name__ == '__main__':
     app()
\ No newline at end of file
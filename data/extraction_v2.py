@@ -1,27 +1,21 @@
-import geopandas as gpd
 import pandas as pd
 import numpy as np
 import typer
+import hashlib
 import re
 import shutil
 
 from termcolor import colored
-from sentence_transformers import SentenceTransformer, util
 from sklearn.cluster import AgglomerativeClustering
-from sklearn.metrics import pairwise_distances_argmin_min
 
 from app.config import *
+from app.utils.areas import assign_areas
+from app.utils.dataloader import DATASET_NAME, PARTITION_COL, partition_name
+from data.embeddings import EmbeddingStore
+from data.manifest import load_manifest, save_manifest, update_digest
+from data.reader import CHUNK_SIZE, ParquetAppender, count_values, iter_licences
 
 app = typer.Typer()
-    
-def sanitize_filename(name: str) -> str:
-    '''
-    Removes slashes and special characters to prevent filesystem errors.
-    Limits the filename to 150 characters.
-    '''
-    if len(name) > 150:
-        name = name[:149]
-    return re.sub(r'[\\/*?:<>|]', '_', name)
 
 def parse_naics_blob(blob, digits: int = 4):
     '''
@@ -60,53 +54,63 @@ def parse_naics_blob(blob, digits: int = 4):
 
     return naics_map
 
+def normalize(embeddings: np.ndarray) -> np.ndarray:
+    '''
+    Scales rows to unit length, so that dot products are cosine similarities.
+    '''
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(norms == 0, 1, norms)
+
+def match_naics(
+    query_embeddings: np.ndarray,
+    corpus_embeddings: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Top-1 cosine similarity search: one matrix product for all queries.
+    Returns the index of the best corpus entry for each query, and its score.
+    '''
+    similarities = normalize(query_embeddings) @ normalize(corpus_embeddings).T
+    best = similarities.argmax(axis=1)
+    return best, similarities[np.arange(len(best)), best]
+
 def condense_labels(
     current_labels: list,
-    model: SentenceTransformer,
+    store: EmbeddingStore,
     distance_threshold: float = 0.4
 ) -> dict:
     '''
     Groups labels using a distance threshold instead of fixed n_clusters.
     distance_threshold=0.4 means "Don't merge clusters if they are more than 0.4 distinct (cosine dist)".
+    Each group is represented by the member closest to the group centroid.
     Returns a dictionary : {Old Label: New Label}
     '''
     
-    embeddings = model.encode(current_labels)
+    embeddings = store.encode(current_labels)
     
     if len(current_labels) < 2:
         return {label: label for label in current_labels}
     
-    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = normalize(embeddings)
     clustering = AgglomerativeClustering(
         n_clusters=None,
         distance_threshold=distance_threshold,
         linkage='ward'
     )
     cluster_assignment = clustering.fit_predict(embeddings)
+    n_clusters = cluster_assignment.max() + 1
     
-    label_map = {}
+    # Centroids: scatter-add the members of each cluster
+    centroids = np.zeros((n_clusters, embeddings.shape[1]))
+    np.add.at(centroids, cluster_assignment, embeddings)
+    centroids /= np.bincount(cluster_assignment, minlength=n_clusters)[:, None]
     
-    df_clusters = pd.DataFrame({
-        'label': current_labels,
-        'cluster': cluster_assignment,
-        'embedding': list(embeddings)
-    })
+    # Nearest member: sort by (cluster, distance to its centroid), keep the first of each cluster
+    distances = ((embeddings - centroids[cluster_assignment]) ** 2).sum(axis=1)
+    order = np.lexsort((distances, cluster_assignment))
+    first = order[np.r_[0, np.flatnonzero(np.diff(cluster_assignment[order])) + 1]]
     
-    for c_id in df_clusters['cluster'].unique():
-        cluster_members = df_clusters[df_clusters['cluster'] == c_id]
-        
-        member_embeddings = np.stack(cluster_members['embedding'].values)
-        
-        centroid = np.mean(member_embeddings, axis=0)
-        
-        closest_idx, _ = pairwise_distances_argmin_min([centroid], member_embeddings)
-        representative_label = cluster_members.iloc[closest_idx[0]]['label']
-        
-        # Map all members to this representative label
-        for member in cluster_members['label'].tolist():
-            label_map[member] = representative_label
-            
-    return label_map
+    representatives = np.asarray(current_labels, dtype=object)[first]
+    return dict(zip(current_labels, representatives[cluster_assignment]))
 
 @app.command()
 def main(
@@ -114,13 +118,13 @@ def main(
         RAW_COMPANY_DATA, 
         '--input', 
         '-i', 
-        help='Path to the raw GeoJSON company data file.'
+        help='Path to the raw company data file (GeoJSON, GeoParquet or CSV).'
     ),
     output_dir: Path = typer.Option(
         DATA_DIR, 
         '--output', 
         '-o', 
-        help = 'Directory to save the processed parquet files.'
+        help = 'Directory to save the partitioned parquet dataset.'
     ),
     naics_file: Path = typer.Option(
         Path('data/raw/industry-titles.csv'),
@@ -139,19 +143,45 @@ def main(
         '--threshold',
         '-t',
         help='Distance threshold for merging (0.3=strict, 0.8=loose).'
+    ),
+    embeddings_dir: Path = typer.Option(
+        RAW_DATA / 'embeddings',
+        '--embeddings',
+        '-e',
+        help='Directory of the persistent embedding store (only new strings are encoded).'
+    ),
+    chunk_size: int = typer.Option(
+        CHUNK_SIZE,
+        '--chunk-size',
+        '-c',
+        help='Rows read at once from the raw file (bounds peak memory).'
+    ),
+    replace_master: bool = typer.Option(
+        False,
+        '--replace-master',
+        help='Move master files (*.arrow, *.parquet) found in the output directory to data/legacy.'
     )
 ):
     '''
     Processes a raw GeoJSON file downloaded from the City of Chicago's Data Portal (https://data.cityofchicago.org/).
-    This script extracts the business activity IDs and saves the data into separate Parquet files for each ID.
+    This script extracts the business activity IDs and saves the data into a Hive-partitioned Parquet dataset, one partition per ID.
     An index file is written with all unique IDs and associated label.
     '''
-    # --- 1. Loading Data ---
-    # Company Data
-    print(colored(f'Processing raw GeoJSON file: {input_file}', 'blue', attrs=['bold']))
-    df = gpd.read_file(input_file)
+    # The backend serves a master file over the dataset (see find_master_file):
+    # next to one, the new dataset and its index would silently not be used
+    masters = sorted(path for pattern in ('*.arrow', '*.parquet') for path in output_dir.glob(pattern))
+    if masters and not replace_master:
+        print(colored(
+            f'{", ".join(path.name for path in masters)} in {output_dir} would be served instead of the dataset. '
+            f'Rerun with --replace-master to move {"it" if len(masters) == 1 else "them"} to data/legacy.',
+            'red', attrs=['bold']
+        ))
+        raise typer.Exit(code=1)
     
-    clean_df = df.loc[:, [ACT_COL, NAME_COL, DESC_COL, 'geometry']].copy()
+    # --- 1. Loading Data ---
+    # Company Data: only the unique activities, rows are streamed in chunks later
+    print(colored(f'Scanning raw company data: {input_file}', 'blue', attrs=['bold']))
+    activity_counts = count_values(input_file, DESC_COL, chunk_size)
     
     # NAICS Labels
     print(colored(f'Parcing NAICS dictionary...', 'blue'))
@@ -164,81 +194,98 @@ def main(
     print(f'Loaded {len(naics_descriptions)} unique NAICS categories.')
     
     # --- 2. Generate Embeddings ---
-    print(colored('Loading SentenceTransformers Model...', 'yellow'))
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    # The SentenceTransformers model is only loaded if some strings were never embedded
+    store = EmbeddingStore(embeddings_dir, 'all-MiniLM-L6-v2')
+    print(colored(f'Embedding store: {len(store):,d} known strings.', 'yellow'))
     
     print(colored('Embedding NAICS standards...', 'yellow'))
-    corpus_embeddings = model.encode(
-        naics_descriptions, 
-        convert_to_tensor=True, 
-        show_progress_bar=True
-    )
+    corpus_embeddings = store.encode(naics_descriptions, show_progress_bar=True)
     
-    unique_activities = clean_df[DESC_COL].dropna().unique().tolist()
+    unique_activities = list(activity_counts)
     print(colored(f'Embedding {len(unique_activities)} unique raw activities...', 'yellow'))
-    query_embeddings = model.encode(unique_activities, convert_to_tensor=True, show_progress_bar=True)
+    query_embeddings = store.encode(unique_activities, show_progress_bar=True)
 
     print(colored('Matching activities to nearest NAICS code...', 'yellow'))
     # Top 1 Search
-    search_results = util.semantic_search(
-        query_embeddings, 
-        corpus_embeddings, 
-        top_k=1
-    )
-    
-    initial_map = {}
-
-    for i, result_list in enumerate(search_results):
-        best_match = result_list[0]
-        
-        score = best_match['score']
-        corpus_idx = best_match['corpus_id']
-        
-        if score > 0.4:
-            initial_map[unique_activities[i]] = naics_descriptions[corpus_idx]
-        else:
-            initial_map[unique_activities[i]] = 'Unclassified'
-    
+    best_match, score = match_naics(query_embeddings, corpus_embeddings)
+    matched = np.where(score > 0.4, np.asarray(naics_descriptions, dtype=object)[best_match], 'Unclassified')
+    initial_map = dict(zip(unique_activities, matched))
     
-    # Apply map
-    clean_df['clean_activity'] = clean_df[DESC_COL].map(initial_map)
-    # Map the description to the code
-    clean_df['naics_code'] = clean_df['clean_activity'].map(clean_naics_dict)
-
     # --- 4. CONDENSE LABELS ---
-    found_labels = [x for x in clean_df['clean_activity'].unique()]
-    tight_label_map = condense_labels(found_labels, model, clustering_threshold)
+    found_labels = list(dict.fromkeys(initial_map.values()))
+    tight_label_map = condense_labels(found_labels, store, clustering_threshold)
     tight_label_map["Unclassified"] = "Unclassified"
     
-    clean_df['clean_activity'] = clean_df['clean_activity'].map(tight_label_map)
+    # Raw description -> representative label, applied chunk by chunk
+    activity_map = {raw: tight_label_map[label] for raw, label in initial_map.items()}
+
+    # Labels, NAICS codes (of the representative label), community areas & neighborhoods.
+    # Each chunk is grouped once and appended to the Hive-partitioned dataset
+    # (one `clean_activity=<label>` directory per label) in a staging directory.
+    # Every partition is a single file, kept open for appending until the last chunk.
+    print(colored('Labelling licences and joining community areas and neighborhoods...', 'yellow'))
+    dataset_dir = output_dir / DATASET_NAME
+    staging_dir = output_dir / f'.{DATASET_NAME}.tmp'
+    shutil.rmtree(staging_dir, ignore_errors=True)
     
-    # Map codes (This will map to the code of the representative label)
-    clean_df['naics_code'] = clean_df['clean_activity'].map(clean_naics_dict)
+    digests = {}
+    writers = {}
+    total_records = 0
+    try:
+        for chunk in iter_licences(input_file, [ACT_COL, NAME_COL, DESC_COL], chunk_size):
+            chunk['clean_activity'] = chunk[DESC_COL].map(activity_map)
+            chunk['naics_code'] = chunk['clean_activity'].map(clean_naics_dict)
+            chunk = assign_areas(chunk)
+            total_records += len(chunk)
+            
+            for label, group in chunk.groupby('clean_activity', sort=False):
+                if label == '':
+                    continue
+                # The label is stored in the directory name only
+                group = group.drop(columns='clean_activity')
+                partition = partition_name(PARTITION_COL, label)
+                update_digest(digests.setdefault(partition, hashlib.sha1()), group)
+                if partition not in writers:
+                    (staging_dir / partition).mkdir(parents=True)
+                    writers[partition] = ParquetAppender(staging_dir / partition / 'part-0.parquet')
+                writers[partition].append(group)
+    finally:
+        for writer in writers.values():
+            writer.close()
 
     # --- 5. SAVE RESULTS ---
-    unique_clean_labels = clean_df['clean_activity'].unique()
+    manifest = {partition: digest.hexdigest() for partition, digest in digests.items()}
     
-    print(f'Total records: {len(clean_df):,d}.')
-    print(f'Reduced {len(unique_activities)} raw categories -> {len(unique_clean_labels)} NAICS categories.')
+    print(f'Total records: {total_records:,d}.')
+    print(f'Reduced {len(unique_activities)} raw categories -> {len(manifest)} NAICS categories.')
     
-    if output_dir.exists():
-        shutil.rmtree(output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
+    # Only partitions whose content changed since the last run are replaced
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+    previous_manifest = load_manifest(dataset_dir)
     
     saved_count = 0
-    for label in unique_clean_labels:
-        if pd.isna(label) or label == '':
+    for partition, digest in manifest.items():
+        if previous_manifest.get(partition) == digest and (dataset_dir / partition).exists():
             continue
-            
-        # Isolate data
-        subset_df = clean_df[clean_df['clean_activity'] == label]
-        
-        # Handle Unclassified separately or sanitize name
-        fname = 'Unclassified' if label == 'Unclassified' else sanitize_filename(label)
-        output_path = output_dir / f'{fname}.parquet'
-            
-        gpd.GeoDataFrame(subset_df).to_parquet(output_path)
+        shutil.rmtree(dataset_dir / partition, ignore_errors=True)
+        (staging_dir / partition).rename(dataset_dir / partition)
         saved_count += 1
+    
+    # Categories that disappeared
+    for stale in previous_manifest.keys() - manifest.keys():
+        shutil.rmtree(dataset_dir / stale, ignore_errors=True)
+    # Left untouched when nothing changed: the backend derives its cache version from it
+    if manifest != previous_manifest:
+        save_manifest(dataset_dir, manifest)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    
+    # Only once the dataset is complete: until then the old master keeps being served
+    legacy_dir = Path('data/legacy')
+    for master in masters:
+        legacy_dir.mkdir(parents=True, exist_ok=True)
+        (legacy_dir / master.name).unlink(missing_ok=True)
+        shutil.move(master, legacy_dir / master.name)
+        print(f'Moved {master.name} to {legacy_dir}.')
 
     # Save Index
     index_df = pd.DataFrame({
@@ -251,7 +298,7 @@ def main(
     
     index_df.to_csv(output_dir / 'cluster_index.csv', index=False)
 
-    print(colored(f'Processing complete. {saved_count} files created.', 'green', attrs=['bold']))
+    print(colored(f'Processing complete. {saved_count} of {len(manifest)} partitions written to {dataset_dir}.', 'green', attrs=['bold']))
 
 if __name__ == '__main__':
     app()
\ No newline at end of file
@@ -0,0 +1,40 @@
+import geopandas as gpd
+import pandas as pd
+
+import hashlib
+import json
+
+from app.config import *
+from app.utils.dataloader import MANIFEST_FILE
+
+def update_digest(digest, gdf: gpd.GeoDataFrame):
+    '''
+    Feeds a frame (values, column names and geometries, not the index) to a hashlib object.
+    Hashing consecutive chunks gives the digest of the whole stream.
+    '''
+    digest.update(json.dumps(list(map(str, gdf.columns))).encode())
+
+    attributes = gdf.drop(columns=gdf.geometry.name) if isinstance(gdf, gpd.GeoDataFrame) else gdf
+    digest.update(pd.util.hash_pandas_object(attributes, index=False).values.tobytes())
+
+    if isinstance(gdf, gpd.GeoDataFrame):
+        for wkb in gdf.geometry.to_wkb():
+            digest.update(wkb or b'')
+
+def frame_digest(gdf: gpd.GeoDataFrame) -> str:
+    '''
+    Content hash of a frame.
+    '''
+    digest = hashlib.sha1()
+    update_digest(digest, gdf)
+    return digest.hexdigest()
+
+def load_manifest(output_dir: Path) -> dict[str, str]:
+    '''
+    {file name: digest} of the outputs written by the previous run.
+    '''
+    path = output_dir / MANIFEST_FILE
+    return json.loads(path.read_text()) if path.exists() else {}
+
+def save_manifest(output_dir: Path, manifest: dict[str, str]):
+    (output_dir / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2, sort_keys=True))
@@ -0,0 +1,116 @@
+import geopandas as gpd
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyogrio
+
+import json
+
+from collections import Counter
+from typing import Iterator
+
+from geopandas.io.arrow import _geopandas_to_arrow
+
+from app.config import *
+
+CHUNK_SIZE = 50_000
+CSV_COORDS = ('longitude', 'latitude')
+
+def iter_licences(
+    path: Path,
+    columns: list[str],
+    chunk_size: int=CHUNK_SIZE
+) -> Iterator[gpd.GeoDataFrame]:
+    '''
+    Reads a licences file in chunks of at most `chunk_size` rows, keeping only `columns` and the geometry.
+    Accepts the raw GeoJSON (or any OGR source), a (Geo)Parquet file, or the portal's CSV export
+    with `latitude`/`longitude` columns. Chunks are in EPSG:4326.
+    '''
+    columns = list(dict.fromkeys(columns))
+    suffix = path.suffix.lower()
+
+    if suffix == '.parquet':
+        parquet = pq.ParquetFile(path)
+        geometry = 'geometry' if 'geometry' in parquet.schema_arrow.names else None
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns + ([geometry] if geometry else [])):
+            df = batch.to_pandas()
+            if geometry:
+                yield gpd.GeoDataFrame(
+                    df.drop(columns=geometry),
+                    geometry=gpd.GeoSeries.from_wkb(df[geometry]),
+                    crs='EPSG:4326'
+                )
+            else:
+                yield _with_coords(df, columns)
+
+    elif suffix == '.csv':
+        for df in pd.read_csv(path, usecols=columns + list(CSV_COORDS), chunksize=chunk_size):
+            yield _with_coords(df, columns)
+
+    else:
+        # Streamed by GDAL as Arrow batches: only one batch is in memory at a time
+        with pyogrio.open_arrow(path, columns=columns, batch_size=chunk_size, use_pyarrow=True) as (meta, reader):
+            geometry = meta['geometry_name'] or 'wkb_geometry'
+            for batch in reader:
+                df = pa.Table.from_batches([batch]).to_pandas()
+                yield gpd.GeoDataFrame(
+                    df.drop(columns=geometry),
+                    geometry=gpd.GeoSeries.from_wkb(df[geometry]),
+                    crs=meta['crs']
+                ).to_crs('EPSG:4326')
+
+def _with_coords(df: pd.DataFrame, columns: list[str]) -> gpd.GeoDataFrame:
+    '''
+    Points from the coordinate columns, dropping rows without coordinates.
+    '''
+    df = df.dropna(subset=list(CSV_COORDS))
+    return gpd.GeoDataFrame(
+        df.loc[:, columns],
+        geometry=gpd.points_from_xy(df[CSV_COORDS[0]], df[CSV_COORDS[1]]),
+        crs='EPSG:4326'
+    )
+
+def count_values(
+    path: Path,
+    column: str,
+    chunk_size: int=CHUNK_SIZE
+) -> Counter:
+    '''
+    First pass: number of licences per value of `column`, without keeping any row.
+    '''
+    counts = Counter()
+    for chunk in iter_licences(path, [column], chunk_size):
+        counts.update(chunk[column].dropna().value_counts().to_dict())
+    return counts
+
+class ParquetAppender:
+    '''
+    Appends GeoDataFrame chunks to a single GeoParquet file.
+    The schema and GeoParquet metadata are taken from the first chunk
+    (without its bounding box, which would not cover later chunks).
+    '''
+    def __init__(self, path: Path):
+        self.path = path
+        self.writer = None
+        self.rows = 0
+
+    def append(self, gdf: gpd.GeoDataFrame):
+        table = _geopandas_to_arrow(gdf, index=False)
+        if self.writer is None:
+            geo = json.loads(table.schema.metadata[b'geo'])
+            for column in geo['columns'].values():
+                column.pop('bbox', None)
+            schema = table.schema.with_metadata({**table.schema.metadata, b'geo': json.dumps(geo).encode()})
+            self.writer = pq.ParquetWriter(self.path, schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+        self.rows += len(gdf)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,51 @@
+import geopandas as gpd
+import typer
+import shutil
+
+from termcolor import colored
+
+from app.config import *
+from app.utils.dataloader import read_partitioned, write_master_arrow
+
+app = typer.Typer()
+
+@app.command()
+def main(
+    input_file: Path = typer.Option(
+        DATA_DIR / 'chicago_licenses_master.parquet',
+        '--input',
+        '-i',
+        help='Path to the master Parquet file or partitioned dataset directory.'
+    ),
+    output_file: Path = typer.Option(
+        None,
+        '--output',
+        '-o',
+        help='Path of the Arrow file (defaults to the input path with an .arrow suffix).'
+    ),
+    keep_parquet: bool = typer.Option(
+        True,
+        help='Keep the Parquet file next to the Arrow file.'
+    )
+):
+    '''
+    Converts the master Parquet file into the uncompressed Arrow IPC file memory-mapped by the backend.
+    Coordinates are stored as plain `lon`/`lat` float columns.
+    Optional (the backend falls back to Parquet) and not memory-bounded: the whole
+    master is loaded and sorted at once, unlike the chunked extraction scripts.
+    '''
+    output_file = output_file or input_file.with_suffix('.arrow')
+    
+    print(colored(f'Converting {input_file} to {output_file}...', 'blue'))
+    gdf = read_partitioned(input_file) if input_file.is_dir() else gpd.read_parquet(input_file)
+    write_master_arrow(gdf, output_file)
+    
+    if not keep_parquet and input_file.is_dir():
+        shutil.rmtree(input_file)
+    elif not keep_parquet:
+        input_file.unlink()
+    
+    print(colored('Conversion complete.', 'green', attrs=['bold']))
+
+if __name__ == '__main__':
+    app()
@@ -1,10 +1,9 @@
 import folium
 import re
 import requests
+import pydeck as pdk
 import streamlit as st
-
-from streamlit_folium import folium_static
-from folium.plugins import FastMarkerCluster
+import streamlit.components.v1 as components
 
 from utils.utils import *
 from utils.config import *
@@ -92,10 +91,12 @@ with st.sidebar:
     activity_list = get_activity_codes()
     activity_labels = tuple(activity_list)
     
-    selected_code=st.selectbox(
+    selected_codes=st.multiselect(
         'Activity Codes',
         options=activity_labels,
-        help='Select the activity codes to display.'
+        default=activity_labels[:1],
+        max_selections=MAX_CATEGORIES,
+        help='Select the activity codes to display. Each category is drawn as its own layer.'
     )
     
     marker_size = st.slider('Dot size', 1.0, 10.0, 2.0, step=0.5)
@@ -118,142 +119,112 @@ with st.sidebar:
     generate = st.sidebar.button('Generate Map', on_click=trigger_map)
 
 # --- Main logic ---
+# Rendered maps (folium HTML, or a pydeck Deck) keyed by their data inputs.
+# The dot size is not part of the key: it is applied on display.
 if 'map' not in st.session_state:
     st.session_state['map'] = None
+if 'maps' not in st.session_state:
+    st.session_state['maps'] = {}
+
+map_key = (tuple(selected_codes), enable_clustering, eps, min_samples)
 
 map_placeholder = st.empty()
 
+if st.session_state.get('trigger', False) and map_key in st.session_state['maps']:
+    # Same inputs as a map already rendered in this session
+    st.session_state['map'] = map_key
+    st.session_state['trigger'] = False
+
 if st.session_state.get('trigger', False):
     with st.spinner('Map loading...'):
-        if not selected_code:
+        if not selected_codes:
             st.warning('Please select at least one activity code.')
             st.session_state['trigger'] = False
             st.rerun()
         
-        geojson_data = get_geojson(
-            act_codes=selected_code,
+        # Compact Arrow payloads first: their size decides the renderer
+        tables = {}
+        for code, table, error in iter_categories(
+            'points/arrow',
+            act_codes=selected_codes,
             clustering=enable_clustering,
             eps=eps,
             min_samples=min_samples
-        )
+        ):
+            if error is not None:
+                show_api_error('points/arrow', error)
+            elif table is not None:
+                tables[code] = table
         
-        if not geojson_data or not geojson_data.get('features'):
+        if not tables:
             st.warning('No data returned for the selected filters.')
             st.session_state['trigger'] = False
             st.rerun()
         
-        center, zoom = get_bounds_from_geojson(geojson_data)
-        m = folium.Map(location=center, zoom_start=zoom, tiles='cartodb positron')
-        
-        if enable_clustering:
-            cluster_colors = get_cluster_colormap(geojson_data)
-            
-            noise_features = [f for f in geojson_data['features']
-                            if f.get('properties', {}).get('cluster') == -1]
-            clustered_features = [f for f in geojson_data['features']
-                            if f.get('properties', {}).get('cluster') != -1]
-            
-            if noise_features:
-                folium.GeoJson(
-                    {'type': 'FeatureCollection', 'features': noise_features},
-                    name='Noise Points',
-                    marker=folium.Circle(
-                        radius=marker_size * 0.5, color='#888888', fill_opacity=0.7
-                    ),
-                    tooltip=folium.GeoJsonTooltip(
-                        fields=['doing_business_as_name', 'cluster'],
-                        aliases=['Business Name:', 'Cluster:']
-                    ),
-                    zoom_on_click=True
-                ).add_to(m)
-            
+        if sum(table.num_rows for table in tables.values()) > WEBGL_THRESHOLD:
+            m = build_deck(
+                {code: tables[code] for code in selected_codes if code in tables},
+                enable_clustering,
+                marker_size
+            )
+        else:
+            m = folium.Map(location=[41.9, -87.6], zoom_start=10, tiles='cartodb positron')
+            bounds = []
             
-            cluster_groups = {}
-            for f in clustered_features:
-                cid = f['properties']['cluster']
-                coords = f['geometry']['coordinates']
-                if cid not in cluster_groups: 
-                    cluster_groups[cid] = []
-                cluster_groups[cid].append(coords)
+            if enable_clustering:
+                # Cluster territories are only part of the GeoJSON payload.
+                # Categories are fetched concurrently; layers are added as responses arrive
+                layers = iter_categories(
+                    'geojson',
+                    act_codes=selected_codes,
+                    clustering=enable_clustering,
+                    eps=eps,
+                    min_samples=min_samples
+                )
+            else:
+                # The Arrow payloads already hold every point: no second round trip
+                layers = (
+                    (code, table_to_geojson(tables[code]), None)
+                    for code in selected_codes if code in tables
+                )
             
-            hull_features = []
-            for cid, points in cluster_groups.items():
-                if len(points) < 3: continue
-                
-                hull = MultiPoint(points).convex_hull
-                
-                if hull.geom_type == 'Polygon':
-                    exterior_coords = [[p[0], p[1]] for p in hull.exterior.coords]
-                    
-                    hull_features.append({
-                        'type': 'Feature',
-                        'geometry': {
-                            'type': 'Polygon',
-                            'coordinates': [exterior_coords]
-                        },
-                        'properties': {'cluster': cid, 'tooltip': f'Cluster {cid} Territory'}
-                    })
-
-            if hull_features:
-                folium.GeoJson(
-                    {'type': 'FeatureCollection', 'features': hull_features},
-                    name='Cluster Territories',
-                    style_function=lambda x: {
-                        'fillColor': cluster_colors.get(x['properties']['cluster'], '#3388ff'),
-                        'color': cluster_colors.get(x['properties']['cluster'], '#3388ff'),
-                        'weight': 2,
-                        'fillOpacity': 0.1
-                    },
-                    tooltip=folium.GeoJsonTooltip(fields=['tooltip'], labels=False)
-                ).add_to(m)
-            
-            if clustered_features:
-                folium.GeoJson(
-                    {'type': 'FeatureCollection', 'features': clustered_features},
-                    name='Clustered Points',
-                    marker=folium.CircleMarker(
-                        radius=marker_size,
-                    ),
-                    tooltip=folium.GeoJsonTooltip(
-                        fields=['doing_business_as_name', 'cluster'],
-                        aliases=['Business Name:', 'Cluster:']
-                    ),
-                    style_function=lambda x: {
-                        'fillColor': cluster_colors.get(x['properties']['cluster'], '#000000'),
-                        'color': cluster_colors.get(x['properties']['cluster'], '#000000'),
-                        'fillOpacity': 0.8,
-                    },
-                    zoom_on_click=True
-                ).add_to(m)
-                
-        else:
-            folium.GeoJson(
-                geojson_data,
-                name='Registered Businesses',
-                marker=folium.CircleMarker(
-                    radius=marker_size, color='#3676E3', fill_opacity=0.7
-                ),
-                tooltip=folium.GeoJsonTooltip(
-                    fields=['doing_business_as_name'],
-                    aliases=['Business Name:']
-                ),
-                zoom_on_click=True
-            ).add_to(m)
+            for code, geojson_data, error in layers:
+                if error is not None:
+                    show_api_error('geojson', error)
+                elif geojson_data and geojson_data.get('features'):
+                    color = CATEGORY_COLORS[selected_codes.index(code) % len(CATEGORY_COLORS)]
+                    add_category_layers(m, code, geojson_data, color, enable_clustering, marker_size)
+                    bounds.append(geojson_data['bbox'])
         
-        folium.LayerControl().add_to(m)
+            if not bounds:
+                st.warning('No data returned for the selected filters.')
+                st.session_state['trigger'] = False
+                st.rerun()
         
-        st.session_state['map'] = m
+            m.location, _ = merge_bounds(bounds)
+        
+            folium.LayerControl().add_to(m)
+        
+        maps = st.session_state['maps']
+        maps[map_key] = m if isinstance(m, pdk.Deck) else (m.get_root().render(), m.get_name())
+        while len(maps) > MAP_CACHE_SIZE:
+            maps.pop(next(iter(maps)))
+        st.session_state['map'] = map_key
     
     st.session_state['trigger'] = False
 
 
-if st.session_state['map']:
+current_map = st.session_state['maps'].get(st.session_state['map'])
+
+if isinstance(current_map, pdk.Deck):
+    for layer in current_map.layers:
+        layer.get_radius = marker_size
     with map_placeholder.container():
-        folium_static(
-            st.session_state['map'],
-            width=1400,
-            height=700
-        )
+        st.pydeck_chart(current_map, height=700)
+elif current_map:
+    html, map_name = current_map
+    with map_placeholder.container():
+        components.html(with_marker_size(html, map_name, marker_size), width=1400, height=700)
         
 st.markdown(
     """
@@ -0,0 +1,71 @@
+import json
+import sys
+
+from pathlib import Path
+
+import folium
+import pyarrow as pa
+import pytest
+
+# Frontend modules are imported relative to frontend/, as under `streamlit run Home.py`
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from utils.utils import add_category_layers, build_deck, get_cluster_colormap, table_to_geojson
+
+CODE = 'Retail Food Establishment'
+
+def points_table(clustering):
+    '''
+    Arrow points payload, as returned by /points/arrow.
+    '''
+    columns = {
+        'lon': pa.array([-87.63, -87.631, -87.632, -87.70, -87.701, -87.702, -87.80], pa.float32()),
+        'lat': pa.array([41.88, 41.881, 41.882, 41.95, 41.951, 41.952, 41.70], pa.float32()),
+        'doing_business_as_name': pa.array(['A', 'B', 'C', 'D', 'E', 'F', 'G']).dictionary_encode()
+    }
+    if clustering:
+        columns['cluster'] = pa.array([0, 0, 0, 1, 1, 1, -1], pa.int32())
+    return pa.table(columns)
+
+def clustered_geojson():
+    '''
+    Clustered payload, as returned by /geojson: points and per-cluster summaries.
+    '''
+    geojson = table_to_geojson(points_table(clustering=True))
+    geojson['clusters'] = [
+        {
+            'cluster': cluster,
+            'count': 3,
+            'centroid': [lon + 0.001, lat + 0.001],
+            'bbox': [lon, lat, lon + 0.002, lat + 0.002],
+            'hull': {
+                'type': 'Polygon',
+                'coordinates': [[[lon, lat], [lon + 0.002, lat], [lon + 0.002, lat + 0.002], [lon, lat]]]
+            }
+        }
+        for cluster, (lon, lat) in enumerate([(-87.632, 41.88), (-87.702, 41.95)])
+    ]
+    return geojson
+
+@pytest.mark.parametrize('clustering', [False, True])
+def test_folium_map(clustering):
+    geojson = clustered_geojson() if clustering else table_to_geojson(points_table(clustering=False))
+    m = folium.Map(location=[41.9, -87.6], zoom_start=10)
+    add_category_layers(m, CODE, geojson, '#3676E3', clustering, 2.0)
+    html = m.get_root().render()
+
+    assert 'doing_business_as_name' in html
+    assert ('Cluster 1 Territory' in html) == clustering
+
+@pytest.mark.parametrize('clustering', [False, True])
+def test_deck_map(clustering):
+    deck = build_deck({CODE: points_table(clustering)}, clustering, 2.0)
+    spec = json.loads(deck.to_json())
+
+    assert [layer['id'] for layer in spec['layers']] == [CODE]
+    assert spec['initialViewState']['latitude'] == pytest.approx(41.826, abs=1e-3)
+
+def test_cluster_colormap():
+    colors = get_cluster_colormap(list(range(-1, 30)))
+    assert colors[-1] == '#808080'
+    assert len(set(colors.values())) == 31
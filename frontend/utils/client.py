@@ -0,0 +1,145 @@
+import base64
+import json
+import logging
+import threading
+import time
+import pyarrow as pa
+import requests
+import google.auth.transport.requests
+import google.oauth2.id_token
+
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.config import *
+
+logger = logging.getLogger('gunicorn.error')
+
+# Seconds before retrying after a failed token fetch (e.g. when running locally)
+TOKEN_FAILURE_BACKOFF = 60
+
+def token_expiry(token: str) -> float:
+    '''
+    Expiry (epoch seconds) of a JWT, read from its `exp` claim without verifying it.
+    '''
+    payload = token.split('.')[1]
+    payload += '=' * (-len(payload) % 4)
+    return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+
+def cache_key(endpoint: str, params: dict=None) -> tuple:
+    '''
+    Hashable key of a request: list parameters are order-insensitive.
+    '''
+    items = []
+    for name, value in sorted((params or {}).items()):
+        if isinstance(value, (list, tuple, set)):
+            value = tuple(sorted(map(str, value)))
+        items.append((name, value))
+    return endpoint, tuple(items)
+
+class BackendClient:
+    '''
+    Thread-safe client of the backend API:
+    - one pooled keep-alive `requests.Session`, with retries and compressed transfers,
+    - one ID token, renewed TOKEN_REFRESH_MARGIN seconds before it expires,
+    - an LRU cache of parsed payloads keyed by endpoint and params.
+    Never calls Streamlit: errors are raised to the caller.
+    '''
+    def __init__(
+        self,
+        base_url: str=BACKEND_URL,
+        timeout: int=TIMEOUT,
+        retries: int=RETRIES,
+        pool_size: int=POOL_SIZE
+    ):
+        self.audience = base_url
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout or None
+        
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({'GET'})
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        self._token = None
+        self._token_expiry = 0.0
+        self._token_lock = threading.Lock()
+        
+        self._payloads = OrderedDict()
+        self._payloads_lock = threading.Lock()
+
+    def id_token(self):
+        '''
+        Cached ID token for the backend audience, or None when none can be minted.
+        '''
+        with self._token_lock:
+            if time.time() < self._token_expiry - TOKEN_REFRESH_MARGIN:
+                return self._token
+            try:
+                auth_req = google.auth.transport.requests.Request()
+                self._token = google.oauth2.id_token.fetch_id_token(auth_req, self.audience)
+                self._token_expiry = token_expiry(self._token)
+            except Exception as e:
+                logger.warning(f'Could not fetch ID token: {e}')
+                self._token = None
+                self._token_expiry = time.time() + TOKEN_REFRESH_MARGIN + TOKEN_FAILURE_BACKOFF
+            return self._token
+
+    def request(self, endpoint: str, params: dict=None) -> requests.Response:
+        '''
+        Uncached GET. Raises requests.HTTPError on error statuses.
+        '''
+        headers = {}
+        token = self.id_token()
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        else:
+            logger.warning('Request sent without Auth token.')
+        
+        r = self.session.get(
+            f'{self.base_url}/{endpoint}',
+            params=params,
+            headers=headers,
+            timeout=self.timeout
+        )
+        r.raise_for_status()
+        return r
+
+    def get(self, endpoint: str, params: dict=None):
+        '''
+        Parsed payload of a GET (JSON, a pyarrow Table for Arrow IPC streams,
+        or None for 204 No Content), cached for PAYLOAD_CACHE_TTL.
+        Cached payloads are shared: callers must not modify them.
+        '''
+        key = cache_key(endpoint, params)
+        with self._payloads_lock:
+            entry = self._payloads.get(key)
+            if entry is not None and entry[0] > time.time():
+                self._payloads.move_to_end(key)
+                return entry[1]
+        
+        r = self.request(endpoint, params)
+        if r.status_code == 204:
+            data = None
+        elif 'arrow' in r.headers.get('Content-Type', ''):
+            data = pa.ipc.open_stream(r.content).read_all()
+        else:
+            data = r.json()
+        
+        with self._payloads_lock:
+            self._payloads[key] = (time.time() + PAYLOAD_CACHE_TTL, data)
+            self._payloads.move_to_end(key)
+            while len(self._payloads) > PAYLOAD_CACHE_SIZE:
+                self._payloads.popitem(last=False)
+        return data
+
+    def clear(self):
+        with self._payloads_lock:
+            self._payloads.clear()
@@ -5,4 +5,15 @@ from dotenv import load_dotenv
 load_dotenv()
 
 BACKEND_URL = os.getenv('BACKEND_URL', 'http://DEFAULT_MISSING:8000')
-TIMEOUT = int(os.getenv('TIMEOUT', 0))
\ No newline at end of file
+TIMEOUT = int(os.getenv('TIMEOUT', 0))
+# Backend client (see utils/client.py)
+RETRIES = int(os.getenv('RETRIES', 3)) # Retries on connection errors and 502/503/504
+POOL_SIZE = int(os.getenv('POOL_SIZE', 10)) # Keep-alive connections to the backend
+TOKEN_REFRESH_MARGIN = int(os.getenv('TOKEN_REFRESH_MARGIN', 300)) # Seconds before expiry an ID token is renewed
+PAYLOAD_CACHE_TTL = int(os.getenv('PAYLOAD_CACHE_TTL', 300)) # Seconds a parsed response is reused
+PAYLOAD_CACHE_SIZE = int(os.getenv('PAYLOAD_CACHE_SIZE', 64)) # Parsed responses kept in memory
+
+# Map
+MAX_CATEGORIES = int(os.getenv('MAX_CATEGORIES', 5)) # Categories that can be compared on one map
+WEBGL_THRESHOLD = int(os.getenv('WEBGL_THRESHOLD', 10000)) # Businesses above which the map is drawn with WebGL (pydeck)
+MAP_CACHE_SIZE = int(os.getenv('MAP_CACHE_SIZE', 5)) # Rendered maps kept per session
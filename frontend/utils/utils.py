@@ -1,140 +1,269 @@
+import folium
 import json
-import matplotlib.cm as cm
 import matplotlib.colors as mcolors
+import pydeck as pdk
 import requests
 import streamlit as st
 import os
-import requests
-import streamlit as st
-import google.auth.transport.requests
-import google.oauth2.id_token
 import logging
 
-from shapely.geometry import shape, MultiPoint
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from matplotlib import colormaps
 
+from utils.client import BackendClient
 from utils.config import *
 
 logger = logging.getLogger('gunicorn.error')
 
 # -----------------------
-# TOKEN WRAPPER
+# BACKEND CLIENT
 # -----------------------
 
-def get_id_token(url):
-    try:
-        auth_req = google.auth.transport.requests.Request()
-        return google.oauth2.id_token.fetch_id_token(auth_req, url)
-    except Exception as e:
-        logger.warning(f"Could not fetch ID token: {e}")
-        return None
+@st.cache_resource
+def get_client():
+    '''
+    One pooled client (connections, ID token, parsed payloads) shared by all sessions.
+    '''
+    return BackendClient()
 
-# -----------------------
-# CACHING FUNCTION
-# -----------------------
-
-@st.cache_data(ttl=5)
 def get_api_data(
     endpoint,
     params=None
 ):
-    headers = {}
-    token = get_id_token(BACKEND_URL)    
-    if token:
-        headers['Authorization'] = f'Bearer {token}'
-    else:
-        logger.warning('Request sent without Auth token.')
-
-    url = f'{BACKEND_URL}/{endpoint}'
+    '''
+    Parsed payload of an endpoint (None for 204 No Content or on errors, which are displayed).
+    '''
     try:
-        r = requests.get(
-            url, 
-            params=params, 
-            headers=headers,
-            timeout=TIMEOUT
-        )
-        r.raise_for_status()
-        return r
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 403:
-            st.error('Access Denied (403).')
-        else:
-            st.error(f'Error API fetching {endpoint}: {e}')
-    except requests.RequestException as e:
+        return get_client().get(endpoint, params=params)
+    except (requests.RequestException, ValueError) as e:
+        show_api_error(endpoint, e)
+    return None
+
+def show_api_error(endpoint, e):
+    if isinstance(e, requests.exceptions.HTTPError) and e.response.status_code == 403:
+        st.error('Access Denied (403).')
+    else:
         st.error(f'Error API fetching {endpoint}: {e}')
-        return None
 
 # -----------------------
 # MAIN GET FUNCTIONS
 # -----------------------
 
-@st.cache_data
 def get_activity_codes():
-    response = get_api_data('codes')
-    if response.status_code == 200:
-        return response.json()
-    else:
+    codes = get_api_data('codes')
+    if codes is None:
         st.error('Failed to load activity codes.')
         return {}
+    return codes
 
-@st.cache_data
-def get_geojson(
+def geojson_params(
     act_codes, clustering=False, eps=0.02, min_samples=5
 ):
-    params={
+    return {
         'act_codes': act_codes,
         'clustering': clustering,
         'eps': eps,
         'min_samples': min_samples
     }
-    response = get_api_data('geojson', params=params)
-    if response.status_code==200:
-        try:
-            return response.json()
-        except Exception as e:
-            st.error(f'Failed to parse GeoJSON: {e}')
-            return None
-    elif response.status_code == 204:
-        return None
-    else:
-        st.error(f'Backend error({response.status_code}): {response.text}')
-        return None
+
+def iter_categories(
+    endpoint, act_codes, clustering=False, eps=0.02, min_samples=5
+):
+    '''
+    Fetches each category in its own request (and backend cache entry), concurrently.
+    Yields (code, payload, error) in order of arrival: the map costs the slowest
+    category, not the sum. Worker threads never call Streamlit.
+    '''
+    client = get_client()
+    with ThreadPoolExecutor(max_workers=max(1, min(len(act_codes), POOL_SIZE))) as executor:
+        futures = {
+            executor.submit(client.get, endpoint, geojson_params([code], clustering, eps, min_samples)): code
+            for code in act_codes
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except (requests.RequestException, ValueError) as e:
+                yield futures[future], None, e
     
 # -----------------------
-# OBSOLETE
+# MAP RENDERING
 # -----------------------
 
-def fetch_csv(naf_codes):
-    try:
-        r = requests.get(f'{BACKEND_URL}/data', params={'naf_codes': naf_codes})
-        r.raise_for_status()
-        return r.content
-    except requests.RequestException as e:
-        st.error(f'Erorr while downloading data: {e}')
+MARKER_SIZE_SCRIPT = """
+<script>
+(function() {
+    // Circle markers only: L.Circle radii are in meters
+    var map = %(map)s;
+    function resize(layer) {
+        if (layer instanceof L.CircleMarker && !(layer instanceof L.Circle)) {
+            layer.setRadius(%(radius)s);
+        }
+    }
+    // Markers of GeoJson layers are map layers too; hidden layers are resized when shown
+    map.eachLayer(resize);
+    map.on('layeradd', function(e) { resize(e.layer); });
+})();
+</script>
+"""
+
+def with_marker_size(html, map_name, radius):
+    '''
+    Appends a script setting the radius of every circle marker of a rendered folium map,
+    so that a dot size change is a style update of the cached HTML, not a rebuild.
+    '''
+    script = MARKER_SIZE_SCRIPT % {'map': map_name, 'radius': float(radius)}
+    if '</html>' in html:
+        head, tail = html.rsplit('</html>', 1)
+        return head + script + '</html>' + tail
+    return html + script
 
-def get_bounds_from_geojson(geojson):
-    features = geojson.get('features', [])
-    points = [shape(f['geometry']) for f in features if f['geometry'] is not None]
-    if not points:
-        return [41.9, 87.6], 10
+CATEGORY_COLORS = ['#3676E3'] + [mcolors.to_hex(c) for c in colormaps['tab10'].colors[1:]]
+
+def add_category_layers(m, code, geojson_data, color, clustering, marker_size):
+    '''
+    Adds the points of one category (and its cluster territories) to the map.
+    '''
+    if clustering:
+        # Cluster summaries (hull, centroid, count, bbox) are computed by the backend
+        clusters = geojson_data.get('clusters', [])
+        cluster_colors = get_cluster_colormap([c['cluster'] for c in clusters])
+        
+        hull_features = [
+            {
+                'type': 'Feature',
+                'geometry': c['hull'],
+                'properties': {
+                    'cluster': c['cluster'],
+                    'tooltip': f"{code} - Cluster {c['cluster']} Territory ({c['count']:,d} businesses)"
+                }
+            }
+            for c in clusters if c['hull']['type'] == 'Polygon'
+        ]
+
+        if hull_features:
+            folium.GeoJson(
+                {'type': 'FeatureCollection', 'features': hull_features},
+                name=f'{code} - Cluster Territories',
+                style_function=lambda x: {
+                    'fillColor': cluster_colors.get(x['properties']['cluster'], '#3388ff'),
+                    'color': cluster_colors.get(x['properties']['cluster'], '#3388ff'),
+                    'weight': 2,
+                    'fillOpacity': 0.1
+                },
+                tooltip=folium.GeoJsonTooltip(fields=['tooltip'], labels=False)
+            ).add_to(m)
+        
+        # One layer for all points: noise is greyed out by the style function
+        folium.GeoJson(
+            geojson_data,
+            name=f'{code} - Clustered Points',
+            marker=folium.CircleMarker(
+                radius=marker_size,
+            ),
+            tooltip=folium.GeoJsonTooltip(
+                fields=['doing_business_as_name', 'cluster'],
+                aliases=['Business Name:', 'Cluster:']
+            ),
+            style_function=lambda x: {
+                'fillColor': cluster_colors.get(x['properties']['cluster'], '#000000'),
+                'color': cluster_colors.get(x['properties']['cluster'], '#000000'),
+                'fillOpacity': 0.7 if x['properties']['cluster'] == -1 else 0.8,
+            },
+            zoom_on_click=True
+        ).add_to(m)
+            
+    else:
+        folium.GeoJson(
+            geojson_data,
+            name=code,
+            marker=folium.CircleMarker(
+                radius=marker_size, color=color, fill_opacity=0.7
+            ),
+            tooltip=folium.GeoJsonTooltip(
+                fields=['doing_business_as_name'],
+                aliases=['Business Name:']
+            ),
+            zoom_on_click=True
+        ).add_to(m)
+
+def build_deck(tables, clustering, marker_size):
+    '''
+    WebGL map of large selections: one ScatterplotLayer per category,
+    fed from the Arrow points payloads instead of per-feature Leaflet markers.
+    '''
+    layers, bounds = [], []
+    for code, table in tables.items():
+        df = table.to_pandas()
+        if clustering and 'cluster' in df.columns:
+            cluster_colors = get_cluster_colormap(df['cluster'].unique().tolist())
+            rgb = {cid: [int(255 * v) for v in mcolors.to_rgb(c)] for cid, c in cluster_colors.items()}
+            df['color'] = df['cluster'].map(rgb)
+            fill_color = 'color'
+        else:
+            color = CATEGORY_COLORS[list(tables).index(code) % len(CATEGORY_COLORS)]
+            fill_color = [int(255 * v) for v in mcolors.to_rgb(color)]
+        
+        layers.append(pdk.Layer(
+            'ScatterplotLayer',
+            data=df,
+            id=code,
+            get_position=['lon', 'lat'],
+            get_fill_color=fill_color,
+            get_radius=marker_size,
+            radius_units='pixels',
+            opacity=0.8,
+            pickable=True
+        ))
+        # Plain floats: NumPy scalars are serialized as strings in the deck's JSON
+        bounds.append([float(df['lon'].min()), float(df['lat'].min()), float(df['lon'].max()), float(df['lat'].max())])
     
-    multipoint = MultiPoint(points)
-    bounds = multipoint.bounds  # (minx, miny, maxx, maxy)
-    center = [(bounds[1] + bounds[3]) / 2, (bounds[0] + bounds[2]) / 2]
-    return center, 10
+    (latitude, longitude), zoom = merge_bounds(bounds)
+    tooltip = '{doing_business_as_name}' + ('\nCluster: {cluster}' if clustering else '')
+    return pdk.Deck(
+        layers=layers,
+        initial_view_state=pdk.ViewState(latitude=latitude, longitude=longitude, zoom=zoom),
+        map_style='light',
+        tooltip={'text': tooltip}
+    )
+
+def table_to_geojson(table):
+    '''
+    FeatureCollection (with its bbox) of an Arrow points payload,
+    so that folium layers can be drawn without fetching the GeoJSON endpoint.
+    '''
+    lon, lat = table['lon'].to_numpy(), table['lat'].to_numpy()
+    properties = table.drop_columns(['lon', 'lat']).to_pylist()
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [round(float(x), 6), round(float(y), 6)]},
+                'properties': props
+            }
+            for x, y, props in zip(lon, lat, properties)
+        ],
+        'bbox': [float(lon.min()), float(lat.min()), float(lon.max()), float(lat.max())]
+    }
+
+def merge_bounds(bounds):
+    '''
+    Union of (minx, miny, maxx, maxy) boxes, as a map center.
+    '''
+    if not bounds:
+        return [41.9, -87.6], 10
+    minx, miny = min(b[0] for b in bounds), min(b[1] for b in bounds)
+    maxx, maxy = max(b[2] for b in bounds), max(b[3] for b in bounds)
+    return [(miny + maxy) / 2, (minx + maxx) / 2], 10
 
-def get_cluster_colormap(geojson_data):
+def get_cluster_colormap(cluster_ids):
     """
     Generates a color dictionary for clusters.
     Noise (-1) is always grey.
     Valid clusters get distinct colors from a colormap.
     """
-    features = geojson_data['features']
-    
-    all_ids = sorted(list(set(
-        f['properties'].get('cluster', -1) for f in features
-    )))
-    
-    real_clusters = [c for c in all_ids if c != -1]
+    real_clusters = sorted(set(cluster_ids) - {-1})
     n_clusters = len(real_clusters)
     
     color_map = {}
@@ -143,11 +272,25 @@ def get_cluster_colormap(geojson_data):
     
     if n_clusters > 0:
         cmap_name = 'tab20' if n_clusters <= 20 else 'nipy_spectral'
-        cmap = cm.get_cmap(cmap_name)
+        cmap = colormaps[cmap_name]
         
         for i, cluster_id in enumerate(real_clusters):
-            rgba = cmap(i)
+            # tab20 is indexed by color; the continuous colormap is sampled
+            # evenly, away from its black and grey ends
+            rgba = cmap(i) if n_clusters <= 20 else cmap(0.05 + 0.9 * i / (n_clusters - 1))
             hex_code = mcolors.to_hex(rgba)
             color_map[cluster_id] = hex_code
             
-    return color_map
\ No newline at end of file
+    return color_map
+
+# -----------------------
+# OBSOLETE
+# -----------------------
+
+def fetch_csv(naf_codes):
+    try:
+        r = requests.get(f'{BACKEND_URL}/data', params={'naf_codes': naf_codes})
+        r.raise_for_status()
+        return r.content
+    except requests.RequestException as e:
+        st.error(f'Erorr while downloading data: {e}')